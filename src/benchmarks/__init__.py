@@ -0,0 +1,4 @@
+"""
+Пакет benchmarks содержит скрипты для замеров производительности.
+Скрипты запускаются из каталога src, например: python -m benchmarks.bulk_insert
+"""
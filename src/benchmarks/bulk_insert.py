@@ -0,0 +1,79 @@
+"""
+Замер скорости записи пользователей: create_users_bulk для каждого пользователя отдельно
+против одного вызова create_users_bulk для всех пользователей.
+
+Запуск: python -m benchmarks.bulk_insert --users 5000
+Все изменения откатываются по окончании замера.
+"""
+
+import argparse
+import asyncio
+import datetime
+from database import session_factory, engine
+from passwords import hash_passwords
+from queries import create_users_bulk
+from benchmarks.utils import load_reference, make_users, rows_count, Timer, print_report
+
+
+async def run_row_by_row(users, creator_id: int):
+    async with session_factory() as session:
+        with Timer() as timer:
+            for user in users:
+                password_hashes = await hash_passwords([user.Credentials.password])
+                await create_users_bulk(
+                    [user],
+                    password_hashes,
+                    creator_id,
+                    "Benchmark",
+                    1,
+                    datetime.datetime.now(),
+                    session,
+                )
+        await session.rollback()
+    return timer.elapsed
+
+
+async def run_bulk(users, creator_id: int):
+    async with session_factory() as session:
+        with Timer() as timer:
+            password_hashes = await hash_passwords(
+                [user.Credentials.password for user in users]
+            )
+            await create_users_bulk(
+                users,
+                password_hashes,
+                creator_id,
+                "Benchmark",
+                1,
+                datetime.datetime.now(),
+                session,
+            )
+        await session.rollback()
+    return timer.elapsed
+
+
+async def main(users_count: int, documents_per_user: int, creator_id: int):
+    await load_reference()
+    users = make_users(users_count, documents_per_user)
+    rows = rows_count(users)
+    report = {"users": users_count, "rows": rows}
+    for name, runner in (("row_by_row", run_row_by_row), ("bulk", run_bulk)):
+        elapsed = await runner(users, creator_id)
+        report[name] = {
+            "seconds": round(elapsed, 3),
+            "rows_per_sec": round(rows / elapsed),
+        }
+    report["speedup"] = round(
+        report["bulk"]["rows_per_sec"] / report["row_by_row"]["rows_per_sec"], 1
+    )
+    print_report(report)
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=5000)
+    parser.add_argument("--documents", type=int, default=2)
+    parser.add_argument("--creator-id", type=int, default=1)
+    args = parser.parse_args()
+    asyncio.run(main(args.users, args.documents, args.creator_id))
@@ -0,0 +1,137 @@
+"""
+Замер времени записи запроса с большим числом отправителей
+при разном числе одновременно записываемых блоков Data (INGESTION_CONCURRENCY).
+
+Запуск: python -m benchmarks.concurrent_ingestion --senders 50 --users 200 --concurrency 1 2 4 8
+Записанные пользователи, документы, организации, отметки о посылках и записи изменений удаляются после каждого прогона.
+Число одновременно записываемых блоков не должно превышать DB_POOL_SIZE + DB_MAX_OVERFLOW.
+"""
+
+import argparse
+import asyncio
+import datetime
+from sqlalchemy import delete
+from database import engine, session_factory
+from ingestion import ingest_packages
+from models import (
+    ChangeORM,
+    DocumentsORM,
+    OrganizationORM,
+    ProcessedPackageORM,
+    UserORM,
+)
+from queries import organization_cache
+from schemas import Package
+from benchmarks.utils import load_reference, Timer, make_users, print_report, rows_count
+
+# Диапазон id тестовых пользователей
+START_ID = 30_000_000
+END_ID = 39_999_999
+
+# Префикс oid тестовых организаций
+OID_PREFIX = "1.2.3.4.5.9."
+
+
+def oid_part(index: int):
+    """
+    Функция записи номера отправителя цифрами 1-9, допустимыми в oid.
+    """
+    digits = ""
+    while True:
+        digits = str(index % 9 + 1) + digits
+        index //= 9
+        if not index:
+            return digits
+
+
+def make_request(senders: int, users_per_sender: int, documents_per_user: int):
+    """
+    Функция формирования посылки с заданным числом отправителей.
+    :return (Package, int): посылка и число строк.
+    """
+    data = []
+    rows = 0
+    for index in range(senders):
+        users = make_users(
+            users_per_sender,
+            documents_per_user,
+            START_ID + index * users_per_sender,
+        )
+        rows += rows_count(users)
+        data.append(
+            {
+                "Sender": {
+                    "Organization": {
+                        "oid": f"{OID_PREFIX}{oid_part(index)}",
+                        "fullName": f"Отправитель {index}",
+                    }
+                },
+                "Users": users,
+            }
+        )
+    package = Package.model_validate(
+        {
+            "id": START_ID,
+            "referralGUID": f"{START_ID:018d}:CONCUR",
+            "referralDate": datetime.datetime(2024, 1, 23, 18, 55, 2),
+            "Data": data,
+        }
+    )
+    return package, rows
+
+
+async def cleanup(package: Package):
+    async with session_factory() as session:
+        await session.execute(
+            delete(DocumentsORM).where(DocumentsORM.user_id.between(START_ID, END_ID))
+        )
+        await session.execute(
+            delete(UserORM).where(UserORM.id.between(START_ID, END_ID))
+        )
+        await session.execute(
+            delete(ChangeORM).where(ChangeORM.user_id.between(START_ID, END_ID))
+        )
+        await session.execute(
+            delete(ProcessedPackageORM).where(
+                ProcessedPackageORM.referral_guid == package.referralGUID
+            )
+        )
+        await session.execute(
+            delete(OrganizationORM).where(OrganizationORM.oid.startswith(OID_PREFIX))
+        )
+        await session.commit()
+    organization_cache.clear()
+
+
+async def main(args):
+    await load_reference()
+    package, rows = make_request(args.senders, args.users, args.documents)
+    report = {"senders": args.senders, "rows": rows, "concurrency": {}}
+    await cleanup(package)
+    baseline = None
+    for concurrency in args.concurrency:
+        async with session_factory() as session:
+            with Timer() as timer:
+                result = await ingest_packages(
+                    [package], args.creator_id, session, concurrency=concurrency
+                )
+        await cleanup(package)
+        baseline = baseline or timer.elapsed
+        report["concurrency"][concurrency] = {
+            "seconds": round(timer.elapsed, 3),
+            "rows_per_sec": round(rows / timer.elapsed),
+            "speedup": round(baseline / timer.elapsed, 2),
+            "errors": len(result["errors"]),
+        }
+    print_report(report)
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--senders", type=int, default=50)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--documents", type=int, default=2)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--creator-id", type=int, default=1)
+    asyncio.run(main(parser.parse_args()))
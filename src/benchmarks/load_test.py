@@ -0,0 +1,361 @@
+"""
+Нагрузочный тест всех эндпоинтов API.
+Запускает сервер (server.py) отдельным процессом на локальной базе,
+добавляет N пользователей с M документами и нагружает каждый эндпоинт
+с заданным числом одновременных запросов.
+Результат (пропускная способность, задержки p50/p95/p99) выводится в формате JSON.
+
+Запуск: python -m benchmarks.load_test --users 1000 --documents 2 --concurrency 16
+С параметром --url используется уже запущенный сервер.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import secrets
+import subprocess
+import sys
+import time
+from benchmarks.utils import load_reference, make_users, print_report
+
+# Число пользователей в одной посылке при добавлении данных
+SEED_BATCH_SIZE = 500
+
+
+class HttpClient:
+    """
+    Класс HttpClient. Минимальный HTTP/1.1 клиент с keep-alive соединением.
+    Поддерживает только ответы с заголовком Content-Length.
+    """
+
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+        self._reader = None
+        self._writer = None
+
+    async def request(self, method: str, path: str, headers: dict = None, body=None):
+        """
+        Функция отправки запроса.
+        :return (int, bytes): код ответа и тело ответа.
+        """
+        if self._writer is None:
+            self._reader, self._writer = await asyncio.open_connection(
+                self.host, self.port
+            )
+        payload = b"" if body is None else json.dumps(body).encode()
+        lines = [
+            f"{method} {path} HTTP/1.1",
+            f"Host: {self.host}:{self.port}",
+            "Content-Type: application/json",
+            f"Content-Length: {len(payload)}",
+        ]
+        for name, value in (headers or {}).items():
+            lines.append(f"{name}: {value}")
+        self._writer.write(("\r\n".join(lines) + "\r\n\r\n").encode() + payload)
+        await self._writer.drain()
+        status_line = await self._reader.readline()
+        if not status_line:
+            await self.close()
+            raise ConnectionError("Соединение закрыто сервером")
+        status = int(status_line.split()[1])
+        length = 0
+        keep_alive = True
+        while True:
+            line = await self._reader.readline()
+            if line in (b"\r\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            name = name.strip().lower()
+            if name == "content-length":
+                length = int(value)
+            elif name == "connection" and value.strip().lower() == "close":
+                keep_alive = False
+        content = await self._reader.readexactly(length)
+        if not keep_alive:
+            await self.close()
+        return status, content
+
+    async def close(self):
+        """
+        Функция закрытия соединения.
+        """
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+            self._reader = None
+
+
+def percentile(values: list, percent: float):
+    """
+    Функция вычисления процентиля методом ближайшего ранга.
+    """
+    if not values:
+        return None
+    index = max(0, int(round(percent / 100 * len(values) + 0.5)) - 1)
+    return values[min(index, len(values) - 1)]
+
+
+async def run_scenario(
+    host: str, port: int, make_request, requests: int, concurrency: int
+):
+    """
+    Функция выполнения сценария нагрузки.
+    :param make_request: функция, возвращающая (method, path, headers, body) по номеру запроса.
+    :param requests: общее число запросов.
+    :param concurrency: число одновременных запросов.
+    :return dict: пропускная способность и задержки.
+    """
+    counter = iter(range(requests))
+    latencies = []
+    errors = 0
+
+    async def worker():
+        nonlocal errors
+        client = HttpClient(host, port)
+        try:
+            for number in counter:
+                method, path, headers, body = make_request(number)
+                started = time.perf_counter()
+                try:
+                    status, _ = await client.request(method, path, headers, body)
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    status = 0
+                    await client.close()
+                latencies.append(time.perf_counter() - started)
+                if status >= 300 or status == 0:
+                    errors += 1
+        finally:
+            await client.close()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "requests": requests,
+        "errors": errors,
+        "seconds": round(elapsed, 3),
+        "throughput_rps": round(requests / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+    }
+
+
+def make_package(users, package_id: int):
+    """
+    Функция формирования посылки для POST /api/add_information.
+    """
+    return {
+        "id": package_id,
+        "referralGUID": f"{package_id:018d}:LOADTS",
+        "referralDate": "2024-01-23T18:55:02",
+        "Data": [
+            {
+                "Sender": {
+                    "Organization": {
+                        "oid": "1.2.3.4.5.6.7",
+                        "fullName": "Нагрузочный тест",
+                    }
+                },
+                "Users": [user.model_dump(mode="json") for user in users],
+            }
+        ],
+    }
+
+
+def user_headers(user_id: int):
+    return {"login": f"user{user_id}", "password": "password"}
+
+
+def start_server(port: int, workers: int):
+    """
+    Функция запуска сервера в рабочем режиме (server.py) отдельным процессом.
+    """
+    source_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(
+        os.environ,
+        SERVER_HOST="127.0.0.1",
+        SERVER_PORT=str(port),
+        WORKERS=str(workers),
+        # процессы сервера должны подписывать токены одним ключом
+        TOKEN_SECRET=os.environ.get("TOKEN_SECRET") or secrets.token_hex(32),
+    )
+    command = [sys.executable, os.path.join(source_dir, "server.py")]
+    return subprocess.Popen(command, cwd=source_dir, env=env)
+
+
+async def wait_for_server(host: str, port: int, timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            _, writer = await asyncio.open_connection(host, port)
+            writer.close()
+            return
+        except OSError:
+            await asyncio.sleep(0.2)
+    raise TimeoutError("Сервер не запустился")
+
+
+async def run_load_test(args, host: str, port: int):
+    """
+    Функция выполнения всех сценариев нагрузки.
+    :return dict: результаты по эндпоинтам.
+    """
+    admin = {"login": args.admin_login, "password": args.admin_password}
+    start_id = args.start_id
+    documents_per_user = args.documents
+    seed_users = make_users(args.users, documents_per_user, start_id)
+    # id документов тестовых пользователей: паспорт, полис и т. д.
+    user_documents = {
+        user.id: [document.id for document in user.Documents] for user in seed_users
+    }
+    client = HttpClient(host, port)
+    seed_started = time.perf_counter()
+    for offset in range(0, len(seed_users), SEED_BATCH_SIZE):
+        package = make_package(
+            seed_users[offset : offset + SEED_BATCH_SIZE], start_id + offset
+        )
+        status, content = await client.request(
+            "POST", "/api/add_information", admin, [package]
+        )
+        if status != 200:
+            raise RuntimeError(f"Ошибка добавления данных: {status} {content[:200]}")
+    await client.close()
+    seed_seconds = time.perf_counter() - seed_started
+
+    user_ids = list(user_documents)
+    # id пользователей новых посылок не пересекаются с тестовыми
+    new_id = start_id + args.users
+    pages = max(1, args.users // args.page_size)
+    requests = args.requests
+    concurrency = args.concurrency
+    batch = args.batch
+
+    def add_information(number):
+        first_id = new_id + number * batch
+        users = make_users(batch, documents_per_user, first_id)
+        return "POST", "/api/add_information", admin, [make_package(users, first_id)]
+
+    def get_personal_info(number):
+        return (
+            "GET",
+            "/api/get_personal_info",
+            user_headers(random.choice(user_ids)),
+            None,
+        )
+
+    def get_users_data(number):
+        page = random.randint(1, pages)
+        return "GET", f"/api/get_users_data?page={page}", admin, None
+
+    def update_user(number):
+        user_id = random.choice(user_ids)
+        body = {"firstName": f"Имя{number}", "password": "password"}
+        return "PUT", "/api/update_user", user_headers(user_id), body
+
+    def update_document(number):
+        user_id = random.choice(user_ids)
+        body = {
+            "id": user_documents[user_id][0],
+            "documentType_id": 1,
+            "number": str(number),
+        }
+        return "PUT", "/api/update_document", user_headers(user_id), body
+
+    # удаления расходуют тестовых пользователей, поэтому выполняются последними
+    deletable = user_ids[: len(user_ids) // 2]
+    deleted_documents = [
+        (user_id, document_id)
+        for user_id in user_ids[len(user_ids) // 2 :]
+        for document_id in user_documents[user_id][1:]
+    ]
+
+    def delete_user_document(number):
+        user_id, document_id = deleted_documents[number]
+        path = f"/api/delete_user_document?document_id={document_id}"
+        return "DELETE", path, user_headers(user_id), None
+
+    def delete_user_info(number):
+        return "DELETE", "/api/delete_user_info", user_headers(deletable[number]), None
+
+    scenarios = (
+        ("add_information", add_information, requests),
+        ("get_personal_info", get_personal_info, requests),
+        ("get_users_data", get_users_data, requests),
+        ("update_user", update_user, requests),
+        ("update_document", update_document, requests if documents_per_user else 0),
+        (
+            "delete_user_document",
+            delete_user_document,
+            min(requests, len(deleted_documents)),
+        ),
+        ("delete_user_info", delete_user_info, min(requests, len(deletable))),
+    )
+    report = {
+        "users": args.users,
+        "documents_per_user": documents_per_user,
+        "concurrency": concurrency,
+        "seed_seconds": round(seed_seconds, 3),
+        "endpoints": {},
+    }
+    for name, make_request, count in scenarios:
+        if name in args.skip or count == 0:
+            continue
+        report["endpoints"][name] = await run_scenario(
+            host, port, make_request, count, concurrency
+        )
+    return report
+
+
+async def main(args):
+    await load_reference()
+    host, port = "127.0.0.1", args.port
+    server = None
+    if args.url:
+        host, _, port = args.url.rpartition("//")[2].partition(":")
+        port = int(port or 80)
+    else:
+        server = start_server(port, args.workers)
+    try:
+        await wait_for_server(host, port)
+        report = await run_load_test(args, host, port)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(report, file, ensure_ascii=False, indent=2)
+    print_report(report)
+    return report
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--documents", type=int, default=2)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--batch", type=int, default=10)
+    parser.add_argument("--page-size", type=int, default=10)
+    parser.add_argument(
+        "--start-id",
+        type=int,
+        default=100_000_000 + int(time.time()) % 1000 * 100_000,
+    )
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--url", default=None)
+    parser.add_argument("--admin-login", default="admin")
+    parser.add_argument("--admin-password", default="Admin")
+    parser.add_argument("--skip", nargs="*", default=[])
+    parser.add_argument("--output", default=None)
+    return parser
+
+
+if __name__ == "__main__":
+    asyncio.run(main(build_parser().parse_args()))
@@ -0,0 +1,74 @@
+"""
+Замер времени получения страницы списка пользователей: LIMIT/OFFSET
+против пагинации по ключу (WHERE id > :last_id ORDER BY id).
+
+Запуск: python -m benchmarks.pagination --pages 1 100 10000 --seed
+С флагом --seed в базу предварительно добавляются тестовые пользователи
+в количестве, достаточном для самой дальней страницы.
+"""
+
+import argparse
+import asyncio
+from sqlalchemy import select
+from config import settings
+from database import session_factory, engine
+from models import UserORM
+from queries import get_users_info
+from benchmarks.utils import load_reference, seed_users, Timer, print_report
+
+
+async def last_id_before(session, offset: int):
+    if offset == 0:
+        return 0
+    query = (
+        select(UserORM.id)
+        .where(UserORM.deleted == 0)
+        .order_by(UserORM.id)
+        .offset(offset - 1)
+        .limit(1)
+    )
+    return (await session.execute(query)).scalar_one()
+
+
+async def measure(session, runner, repeat: int):
+    timings = []
+    for _ in range(repeat):
+        with Timer() as timer:
+            await runner()
+        timings.append(timer.elapsed)
+        session.expunge_all()
+    timings.sort()
+    return round(timings[len(timings) // 2] * 1000, 2)
+
+
+async def main(pages: list, repeat: int, seed: bool):
+    await load_reference()
+    limit = settings.PAGE_SIZE
+    async with session_factory() as session:
+        if seed:
+            await seed_users(session, max(pages) * limit)
+        report = {"page_size": limit, "median_ms": {}}
+        for page in pages:
+            offset = (page - 1) * limit
+            after_id = await last_id_before(session, offset)
+            report["median_ms"][page] = {
+                "offset": await measure(
+                    session, lambda: get_users_info(session, limit, offset), repeat
+                ),
+                "cursor": await measure(
+                    session,
+                    lambda: get_users_info(session, limit, after_id=after_id),
+                    repeat,
+                ),
+            }
+    print_report(report)
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pages", type=int, nargs="+", default=[1, 100, 10000])
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--seed", action="store_true")
+    args = parser.parse_args()
+    asyncio.run(main(args.pages, args.repeat, args.seed))
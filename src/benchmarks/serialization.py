@@ -0,0 +1,84 @@
+"""
+Микрозамер сериализации страницы списка пользователей: стандартный путь FastAPI
+(валидация модели ответа и сериализация) против режима FAST_SERIALIZATION
+(приведение данных к виду ответа без валидации и сериализация orjson).
+База данных не требуется: данные страницы формируются в памяти в том виде,
+в котором их возвращает get_users_info_aggregated.
+
+Запуск: python -m benchmarks.serialization --page-size 100 --documents 4
+"""
+
+import argparse
+import asyncio
+import datetime
+import time
+from typing import List
+import orjson
+from pydantic import TypeAdapter
+from common import shape_user_show
+from schemas import UserShow
+from queries import build_user_rows
+from benchmarks.utils import load_reference, make_users, print_report
+
+
+def make_page(page_size: int, documents_per_user: int):
+    now = datetime.datetime.now()
+    page = []
+    for user in make_users(page_size, documents_per_user):
+        user_row, document_rows = build_user_rows(user, 1, "Benchmark", 1, now, now)
+        page.append(
+            {
+                "id": user_row["id"],
+                "type_id": user_row["type_id"],
+                "lastName": user_row["last_name"],
+                "firstName": user_row["first_name"],
+                "patrName": user_row["patr_name"],
+                "gender_id": user_row["gender_id"],
+                "documents": [
+                    {"id": index, "type_id": row["type_id"], "data": row["data"]}
+                    for index, row in enumerate(document_rows)
+                ],
+            }
+        )
+    return page
+
+
+users_show_adapter = TypeAdapter(List[UserShow])
+
+
+def default_path(page):
+    return users_show_adapter.dump_json(users_show_adapter.validate_python(page))
+
+
+def fast_path(page):
+    return orjson.dumps([shape_user_show(user) for user in page])
+
+
+def measure(runner, page, repeat: int):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        runner(page)
+    return round((time.perf_counter() - started) / repeat * 1000, 3)
+
+
+def main(page_size: int, documents_per_user: int, repeat: int):
+    asyncio.run(load_reference())
+    page = make_page(page_size, documents_per_user)
+    report = {
+        "page_size": page_size,
+        "documents_per_user": documents_per_user + 2,
+        "same_output": default_path(page) == fast_path(page),
+        "default_ms": measure(default_path, page, repeat),
+        "fast_ms": measure(fast_path, page, repeat),
+    }
+    report["speedup"] = round(report["default_ms"] / report["fast_ms"], 2)
+    print_report(report)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--documents", type=int, default=4)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+    main(args.page_size, args.documents, args.repeat)
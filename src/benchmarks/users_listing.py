@@ -0,0 +1,69 @@
+"""
+Замер затрат процессора на страницу списка пользователей: ORM с selectinload
+против одного запроса с агрегацией документов JSON_ARRAYAGG.
+В замер включены проверка и сериализация ответа, как их выполняет FastAPI.
+
+Запуск: python -m benchmarks.users_listing --page-size 100 --seed
+"""
+
+import argparse
+import asyncio
+import time
+from typing import List
+from pydantic import TypeAdapter
+from database import session_factory, engine
+from queries import get_users_info, get_users_info_aggregated
+from schemas import UserShow
+from benchmarks.utils import load_reference, seed_users, print_report
+
+response_adapter = TypeAdapter(List[UserShow])
+
+
+async def measure(session, runner, repeat: int):
+    cpu_started = time.process_time()
+    wall_started = time.perf_counter()
+    for _ in range(repeat):
+        users = await runner()
+        response_adapter.dump_json(response_adapter.validate_python(users))
+        session.expunge_all()
+    return {
+        "cpu_ms_per_request": round(
+            (time.process_time() - cpu_started) / repeat * 1000, 2
+        ),
+        "wall_ms_per_request": round(
+            (time.perf_counter() - wall_started) / repeat * 1000, 2
+        ),
+    }
+
+
+async def main(page_size: int, repeat: int, seed: bool):
+    await load_reference()
+    async with session_factory() as session:
+        if seed:
+            await seed_users(session, page_size)
+        report = {
+            "page_size": page_size,
+            "orm": await measure(
+                session, lambda: get_users_info(session, page_size), repeat
+            ),
+            "aggregated": await measure(
+                session, lambda: get_users_info_aggregated(session, page_size), repeat
+            ),
+        }
+    report["cpu_reduction"] = round(
+        1
+        - report["aggregated"]["cpu_ms_per_request"]
+        / report["orm"]["cpu_ms_per_request"],
+        2,
+    )
+    print_report(report)
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--seed", action="store_true")
+    args = parser.parse_args()
+    asyncio.run(main(args.page_size, args.repeat, args.seed))
@@ -0,0 +1,180 @@
+"""
+Модуль utils содержит вспомогательные функции для скриптов замеров.
+"""
+
+import datetime
+import json
+import time
+from sqlalchemy import delete, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import engine
+from models import ChangeORM, DocumentsORM, UserORM
+from passwords import hash_passwords
+from queries import create_users_bulk
+from reference import reference
+from schemas import User, Document
+
+# Начальный id тестовых пользователей seed_users
+SEED_START_ID = 10_000_000
+
+
+async def load_reference():
+    """
+    Функция загрузки справочников для скриптов, которые не запускают приложение.
+    Без справочников проверка пользователей и документов завершается исключением ReferenceNotLoaded.
+    Соединения пула закрываются, поэтому функцию можно вызвать в отдельном цикле событий.
+    """
+    await reference.refresh()
+    await engine.dispose()
+
+
+def document_id(user_id: int, documents_per_user: int, document_index: int):
+    """
+    Функция вычисления id тестового документа пользователя.
+    id отрицательный: явно заданный id меньше счетчика AUTO_INCREMENT не изменяет счетчик,
+    а СНИЛС и ИНН записываются с положительными автоинкрементными id и не совпадают с тестовыми.
+    """
+    return -(user_id * documents_per_user + document_index + 1)
+
+
+def make_users(count: int, documents_per_user: int = 2, start_id: int = 10_000_000):
+    """
+    Функция генерации тестовых пользователей с документами.
+    :param count: число пользователей.
+    :param documents_per_user: число документов (паспорт, полис) у каждого пользователя.
+    :param start_id: начальный id пользователей.
+    :return List[User]
+    """
+    users = []
+    for index in range(count):
+        user_id = start_id + index
+        documents = []
+        for document_index in range(documents_per_user):
+            documents.append(
+                Document(
+                    id=document_id(user_id, documents_per_user, document_index),
+                    documentType_id=1 + document_index % 2,
+                    series=str(1000 + index % 9000),
+                    number=str(user_id),
+                    beginDate=datetime.date(2020, 1, 1),
+                    orgDep_Name="Отдел выдачи",
+                )
+            )
+        users.append(
+            User(
+                id=user_id,
+                lastName=f"Фамилия{user_id}",
+                firstName="Имя",
+                patrName="Отчество",
+                sex=1 + index % 2,
+                phoneNumber=9000000000 + index,
+                snils=str(10_000_000_000 + user_id),
+                inn=str(100_000_000_000 + user_id),
+                Credentials={"username": f"user{user_id}", "password": "password"},
+                Documents=documents,
+            )
+        )
+    return users
+
+
+def rows_count(users: list):
+    """
+    Функция подсчета строк, которые будут записаны для списка пользователей.
+    :param users: список объектов класса User.
+    :return int
+    """
+    count = 0
+    for user in users:
+        count += 1 + len(user.Documents or [])
+        count += user.snils is not None
+        count += user.inn is not None
+    return count
+
+
+async def seed_users(
+    session: AsyncSession,
+    count: int,
+    documents_per_user: int = 2,
+    creator_id: int = 1,
+    batch_size: int = 1000,
+):
+    """
+    Функция добавления в базу тестовых пользователей. Пользователи с уже занятыми id не добавляются повторно.
+    :param session: сессия работы с базой данных.
+    :param count: необходимое число тестовых пользователей.
+    :param documents_per_user: число документов у каждого пользователя.
+    :param creator_id: id пользователя создателя записей.
+    :param batch_size: число пользователей в одной транзакции.
+    :return int: число добавленных пользователей.
+    """
+    start_id = SEED_START_ID
+    query = select(func.count()).where(
+        UserORM.id >= start_id, UserORM.id < start_id + count
+    )
+    existing = (await session.execute(query)).scalar_one()
+    for offset in range(existing, count, batch_size):
+        users = make_users(
+            min(batch_size, count - offset), documents_per_user, start_id + offset
+        )
+        password_hashes = await hash_passwords(
+            [user.Credentials.password for user in users]
+        )
+        await create_users_bulk(
+            users,
+            password_hashes,
+            creator_id,
+            "Benchmark",
+            1,
+            datetime.datetime.now(),
+            session,
+        )
+        await session.commit()
+    return count - existing
+
+
+async def remove_seeded_users(session: AsyncSession, first_id: int, end_id: int):
+    """
+    Функция удаления тестовых пользователей с id из диапазона [first_id, end_id),
+    их документов и записей изменений.
+    :param session: сессия работы с базой данных.
+    :param first_id: первый id удаляемых пользователей.
+    :param end_id: id, следующий за последним удаляемым.
+    """
+    if first_id >= end_id:
+        return
+    await session.execute(
+        delete(DocumentsORM).where(
+            DocumentsORM.user_id >= first_id, DocumentsORM.user_id < end_id
+        )
+    )
+    await session.execute(
+        delete(ChangeORM).where(
+            ChangeORM.user_id >= first_id, ChangeORM.user_id < end_id
+        )
+    )
+    await session.execute(
+        delete(UserORM).where(UserORM.id >= first_id, UserORM.id < end_id)
+    )
+    await session.commit()
+
+
+class Timer:
+    """
+    Класс Timer. Контекстный менеджер для замера времени выполнения блока.
+
+    elapsed - время выполнения в секундах.
+    """
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        self.elapsed = time.perf_counter() - self.started
+
+
+def print_report(report: dict):
+    """
+    Функция вывода результатов замера в формате JSON.
+    """
+    print(json.dumps(report, ensure_ascii=False, indent=2))
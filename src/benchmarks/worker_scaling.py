@@ -0,0 +1,99 @@
+"""
+Замер масштабирования пропускной способности GET запросов по числу процессов сервера.
+Для каждого значения --workers сервер запускается в рабочем режиме (server.py),
+после прогрева нагружаются эндпоинты GET /api/get_personal_info и GET /api/get_users_data.
+Для каждого числа процессов выводится пропускная способность и ускорение относительно первого значения.
+
+Запуск: python -m benchmarks.worker_scaling --workers 1 2 4 --users 1000 --concurrency 64
+Тестовые пользователи добавляются в базу функцией benchmarks.utils.seed_users.
+"""
+
+import argparse
+import asyncio
+import random
+from database import engine, session_factory
+from benchmarks.load_test import (
+    run_scenario,
+    start_server,
+    user_headers,
+    wait_for_server,
+)
+from benchmarks.utils import print_report, seed_users
+
+HOST = "127.0.0.1"
+
+# Начальный id пользователей benchmarks.utils.seed_users
+SEED_START_ID = 10_000_000
+
+
+async def measure(args, workers: int):
+    """
+    Функция замера пропускной способности при заданном числе процессов.
+    :return dict: результаты по эндпоинтам.
+    """
+    admin = {"login": args.admin_login, "password": args.admin_password}
+    user_ids = range(SEED_START_ID, SEED_START_ID + args.users)
+    pages = max(1, args.users // 10)
+
+    def get_personal_info(number):
+        headers = user_headers(random.choice(user_ids))
+        return "GET", "/api/get_personal_info", headers, None
+
+    def get_users_data(number):
+        page = random.randint(1, pages)
+        return "GET", f"/api/get_users_data?page={page}", admin, None
+
+    server = start_server(args.port, workers)
+    try:
+        await wait_for_server(HOST, args.port)
+        # прогрев: все процессы запущены и открыли соединения с базой
+        await run_scenario(
+            HOST, args.port, get_personal_info, args.concurrency * 4, args.concurrency
+        )
+        results = {}
+        for name, make_request in (
+            ("get_personal_info", get_personal_info),
+            ("get_users_data", get_users_data),
+        ):
+            results[name] = await run_scenario(
+                HOST, args.port, make_request, args.requests, args.concurrency
+            )
+        return results
+    finally:
+        server.terminate()
+        server.wait()
+
+
+async def main(args):
+    async with session_factory() as session:
+        await seed_users(session, args.users)
+    await engine.dispose()
+    report = {"concurrency": args.concurrency, "workers": {}}
+    baseline = {}
+    for workers in args.workers:
+        results = await measure(args, workers)
+        for name, result in results.items():
+            baseline.setdefault(name, (workers, result["throughput_rps"]))
+            base_workers, base_rps = baseline[name]
+            speedup = result["throughput_rps"] / base_rps
+            result["speedup"] = round(speedup, 2)
+            result["efficiency"] = round(speedup * base_workers / workers, 2)
+        report["workers"][workers] = results
+    print_report(report)
+    return report
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--port", type=int, default=8101)
+    parser.add_argument("--admin-login", default="admin")
+    parser.add_argument("--admin-password", default="Admin")
+    return parser
+
+
+if __name__ == "__main__":
+    asyncio.run(main(build_parser().parse_args()))
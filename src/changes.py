@@ -0,0 +1,184 @@
+"""
+Модуль changes содержит присвоение порядковых номеров изменениям и уведомления
+о зафиксированных изменениях для ленты изменений.
+
+Функции queries отмечают сессию, в которой добавлены записи таблицы changes.
+Записи добавляются без порядкового номера: номер присваивается после фиксации транзакции,
+поэтому номера возрастают в порядке фиксации, и лента не пропускает изменения
+долгих транзакций. После присвоения номеров ожидающие запросы ленты изменений процесса
+пробуждаются сразу, изменения, записанные другими процессами, обнаруживаются периодическим опросом.
+"""
+
+import asyncio
+import contextvars
+import logging
+from sqlalchemy import case, event, func, select, update
+from sqlalchemy.orm import Session
+from config import settings
+from database import engine
+from models import ChangeORM
+
+logger = logging.getLogger()
+
+
+class ChangeNotifier:
+    """
+    Класс ChangeNotifier. Пробуждает запросы, ожидающие новых изменений.
+    """
+
+    def __init__(self):
+        self._event = None
+
+    def notify(self):
+        """
+        Функция пробуждения всех ожидающих запросов.
+        """
+        if self._event is not None:
+            self._event.set()
+            self._event = None
+
+    async def wait(self, timeout: float):
+        """
+        Функция ожидания уведомления не дольше timeout секунд.
+        :param timeout: время ожидания в секундах.
+        """
+        if self._event is None:
+            self._event = asyncio.Event()
+        try:
+            await asyncio.wait_for(self._event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+
+# Уведомления процесса о новых изменениях
+change_notifier = ChangeNotifier()
+
+# Имя блокировки MySQL, под которой номера присваивает только один процесс
+SEQUENCE_LOCK = f"{engine.url.database}.changes_seq"
+
+
+async def assign_sequence():
+    """
+    Функция присвоения порядковых номеров зафиксированным изменениям без номера.
+    Номера присваиваются под блокировкой GET_LOCK одной транзакцией в порядке id записей,
+    продолжая наибольший присвоенный номер. Незафиксированные записи не видны транзакции
+    и получают номер после своей фиксации, поэтому читатель ленты, получивший номер N,
+    уже видит все изменения с меньшими номерами.
+    :return bool: False, если блокировку не удалось получить за CHANGES_SEQUENCE_LOCK_TIMEOUT секунд.
+    """
+    async with engine.connect() as connection:
+        locked = await connection.scalar(
+            select(func.get_lock(SEQUENCE_LOCK, settings.CHANGES_SEQUENCE_LOCK_TIMEOUT))
+        )
+        await connection.commit()
+        if not locked:
+            return False
+        try:
+            last = await connection.scalar(
+                select(func.coalesce(func.max(ChangeORM.seq), 0))
+            )
+            chunk_size = settings.INSERT_CHUNK_SIZE
+            while True:
+                result = await connection.scalars(
+                    select(ChangeORM.id)
+                    .where(ChangeORM.seq.is_(None))
+                    .order_by(ChangeORM.id)
+                    .limit(chunk_size)
+                )
+                change_ids = result.all()
+                if not change_ids:
+                    break
+                numbers = {
+                    change_id: last + number
+                    for number, change_id in enumerate(change_ids, 1)
+                }
+                await connection.execute(
+                    update(ChangeORM)
+                    .where(ChangeORM.id.in_(change_ids))
+                    .values(seq=case(numbers, value=ChangeORM.id))
+                )
+                last += len(change_ids)
+                if len(change_ids) < chunk_size:
+                    break
+            await connection.commit()
+        finally:
+            await connection.rollback()
+            await connection.execute(select(func.release_lock(SEQUENCE_LOCK)))
+            await connection.commit()
+    return True
+
+
+class ChangeSequencer:
+    """
+    Класс ChangeSequencer. Присваивает порядковые номера изменениям после фиксации транзакций.
+    Запросы, поступившие во время присвоения, объединяются в следующий проход.
+    """
+
+    def __init__(self):
+        self._task = None
+        self._pending = False
+
+    def request(self):
+        """
+        Функция запуска присвоения номеров в фоновой задаче.
+        Задача выполняется в отдельном контексте и не учитывается в статистике запроса к серверу.
+        """
+        self._pending = True
+        if self._task is not None and not self._task.done():
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        self._task = loop.create_task(self._run(), context=contextvars.Context())
+
+    async def _run(self):
+        while self._pending:
+            self._pending = False
+            try:
+                assigned = await assign_sequence()
+            except Exception as exc:
+                logger.error(f"Change sequence assignment failed. {exc}")
+                assigned = False
+            if not assigned:
+                self._pending = True
+                await asyncio.sleep(settings.CHANGES_POLL_INTERVAL)
+                continue
+            change_notifier.notify()
+
+    async def stop(self):
+        """
+        Функция остановки присвоения номеров. Изменения, оставшиеся без номера,
+        получают номер при следующем присвоении в любом процессе.
+        """
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+# Присвоение номеров изменениям процесса
+change_sequencer = ChangeSequencer()
+
+
+def mark_changed(session):
+    """
+    Функция отметки сессии, в которой добавлены записи изменений.
+    :param session: сессия работы с базой данных.
+    """
+    session.info["changes"] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _changes_after_commit(session: Session):
+    if session.info.pop("changes", False):
+        change_sequencer.request()
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _changes_after_rollback(session: Session, previous_transaction):
+    if not previous_transaction.nested:
+        session.info.pop("changes", None)
@@ -2,60 +2,151 @@
 Модуль common содержит вспомогательные функции и классы.
 """
 
+import base64
+import binascii
+import hmac
+import json
+from collections import OrderedDict
+from fastapi import Response
+from pydantic import TypeAdapter
 from exceptions import BadValidation
 from schemas import DocumentShow, DocumentData, UserShow
 from models import UserORM
+from reference import reference
 
+# Адаптер для сериализации ответа без повторной валидации
+user_show_adapter = TypeAdapter(UserShow)
 
-class DocumentsID:
-    """
-    Класс содержит id типов документов
+# Поля DocumentData в порядке объявления
+DOCUMENT_DATA_FIELDS = tuple(DocumentData.model_fields)
 
-    PASSPORT_ID = 1
 
-    POLIS_ID = 2
+class DocumentsID:
+    """
+    Класс содержит id типов документов, которые создаются из полей пользователя.
+    Остальные типы документов и их обязательные поля берутся из справочника reference.
 
     SNILS_ID = 3
 
     INN_ID = 4
     """
 
-    PASSPORT_ID = 1
-    POLIS_ID = 2
     SNILS_ID = 3
     INN_ID = 4
 
 
+class BoundedCache:
+    """
+    Класс BoundedCache. Кэш ограниченного размера в памяти процесса.
+    При переполнении вытесняется запись, которая дольше всех не использовалась.
+
+    max_size - максимальное число записей.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._items = OrderedDict()
+
+    def get(self, key, default=None):
+        """
+        Функция получения значения по ключу.
+        :param key: ключ.
+        :param default: значение, возвращаемое при отсутствии ключа.
+        """
+        if key not in self._items:
+            return default
+        self._items.move_to_end(key)
+        return self._items[key]
+
+    def set(self, key, value):
+        """
+        Функция сохранения значения по ключу.
+        :param key: ключ.
+        :param value: значение.
+        """
+        self._items[key] = value
+        self._items.move_to_end(key)
+        while len(self._items) > self.max_size:
+            self._items.popitem(last=False)
+
+    def pop(self, key, default=None):
+        """
+        Функция удаления значения по ключу.
+        :param key: ключ.
+        :param default: значение, возвращаемое при отсутствии ключа.
+        """
+        return self._items.pop(key, default)
+
+    def clear(self):
+        """
+        Функция очистки кэша.
+        """
+        self._items.clear()
+
+    def __len__(self):
+        return len(self._items)
+
+
+def encode_cursor(last_id: int):
+    """
+    Функция формирования курсора пагинации по id последней выданной записи.
+    :param last_id: id последней записи страницы.
+    :return str: непрозрачный для клиента курсор.
+    """
+    return base64.urlsafe_b64encode(json.dumps({"id": last_id}).encode()).decode()
+
+
+def decode_cursor(cursor: str):
+    """
+    Функция получения id последней выданной записи из курсора пагинации.
+    :param cursor: курсор, полученный функцией encode_cursor.
+    :return int: id последней записи страницы.
+    В случае неверного курсора выбрасывается исключение BadValidation.
+    """
+    try:
+        last_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))["id"]
+    except (binascii.Error, ValueError, TypeError, KeyError):
+        raise BadValidation("Неверный курсор")
+    if not isinstance(last_id, int):
+        raise BadValidation("Неверный курсор")
+    return last_id
+
+
+def check_password(stored_password: str | bytes | None, password: str):
+    """
+    Функция проверки пароля. Сравнение выполняется за постоянное время.
+    :param stored_password: пароль из базы данных в кодировке base64.
+    :param password: переданный пароль.
+    :return bool
+    """
+    if stored_password is None:
+        return False
+    if isinstance(stored_password, str):
+        stored_password = stored_password.encode()
+    return hmac.compare_digest(stored_password, base64.b64encode(password.encode()))
+
+
 def validate_document(document: DocumentData, type_id: int):
     """
     Функция проверки обязательных полей в зависимости от документа.
+    Тип документа и его обязательные поля берутся из справочника типов документов.
     :param document: объект класса DocumentData. Данные документа.
     :param type_id: тип int. Id типа документа.
     В случае ошибки выбразывается исключение, с описанием проблемы.
+    Если справочники не загружены, выбрасывается исключение ReferenceNotLoaded.
     """
-    match type_id:
-        case DocumentsID.PASSPORT_ID:
-            if (
-                document.series is not None
-                and document.beginDate is not None
-                and document.orgDep_Name is not None
-            ):
-                pass
-            else:
-                raise BadValidation(
-                    f"Неверный формат документа {document.id}. Проверьте поля beginData, orgDep_Name, series."
-                )
-        case DocumentsID.POLIS_ID:
-            if document.series is not None and document.orgDep_Name is not None:
-                pass
-            else:
-                raise BadValidation(
-                    f"Неверный формат документа {document.id}. Проверьте поля orgDep_Name, series."
-                )
-        case DocumentsID.SNILS_ID | DocumentsID.INN_ID:
-            pass
-        case _:
-            raise BadValidation(f"Неверный тип документа {document.id}. ")
+    reference.require()
+    if type_id not in reference.document_types:
+        raise BadValidation(f"Неверный тип документа {document.id}. ")
+    missing = [
+        field
+        for field in reference.document_fields.get(type_id, ())
+        if getattr(document, field, None) is None
+    ]
+    if missing:
+        raise BadValidation(
+            f"Неверный формат документа {document.id}. Проверьте поля {', '.join(missing)}."
+        )
 
 
 def create_user_show(user: UserORM):
@@ -71,7 +162,7 @@ def create_user_show(user: UserORM):
             document_show = DocumentShow(
                 id=document.id,
                 type_id=document.type_id,
-                data=DocumentData.model_validate_json(document.data),
+                data=DocumentData.model_validate(document.data),
             )
             list_of_documents.append(document_show)
     user_show = UserShow(
@@ -84,3 +175,57 @@ def create_user_show(user: UserORM):
         documents=list_of_documents,
     )
     return user_show
+
+
+def shape_user_show(user: dict):
+    """
+    Функция приведения данных пользователя из get_users_info_aggregated к виду ответа UserShow без валидации.
+    Данные документов были проверены при записи, поэтому повторная проверка не выполняется.
+    Поля DocumentData добавляются в порядке объявления, затем следуют дополнительные поля,
+    как при сериализации модели pydantic.
+    :param user: словарь с данными пользователя в формате UserShow.
+    :return dict
+    """
+    list_of_documents = []
+    for document in user["documents"]:
+        data = {field: document["data"].get(field) for field in DOCUMENT_DATA_FIELDS}
+        data.update(document["data"])
+        list_of_documents.append(
+            {"id": document["id"], "type_id": document["type_id"], "data": data}
+        )
+    return {
+        "id": user["id"],
+        "type_id": user["type_id"],
+        "lastName": user["lastName"],
+        "firstName": user["firstName"],
+        "patrName": user["patrName"],
+        "gender_id": user["gender_id"],
+        "documents": list_of_documents,
+    }
+
+
+def etag_matches(if_none_match: str | None, etag: str):
+    """
+    Функция сравнения заголовка If-None-Match с тегом версии.
+    Заголовок может содержать несколько тегов через запятую, слабые теги (W/) и *.
+    :param if_none_match: значение заголовка If-None-Match.
+    :param etag: текущий тег версии.
+    :return bool
+    """
+    if not if_none_match:
+        return False
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag == "*" or tag.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+def fast_json_response(content: bytes, headers: dict = None):
+    """
+    Функция формирования JSON ответа из готовых байт, без валидации модели ответа.
+    :param content: сериализованный ответ.
+    :param headers: дополнительные заголовки ответа.
+    :return Response
+    """
+    return Response(content=content, media_type="application/json", headers=headers)
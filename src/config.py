@@ -2,6 +2,7 @@
 Модуль config, содержит параметры сервера.
 """
 
+from typing import Optional
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -21,7 +22,99 @@ class Settings(BaseSettings):
 
     PAGE_SIZE: int  - размер страниц для пагинации
 
+    INSERT_CHUNK_SIZE: int - максимальное число строк в одном многострочном INSERT
+
+    ORGANIZATION_CACHE_SIZE: int - максимальное число организаций в кэше oid -> id процесса
+
+    DELETE_CHUNK_SIZE: int - максимальное число id в одном UPDATE ... WHERE id IN (...) пакетного удаления
+
+    STREAM_CHUNK_SIZE: int - число пользователей в одной транзакции потоковой загрузки
+
+    INGESTION_CONCURRENCY: int - число отправителей одного запроса загрузки, которые записываются одновременно,
+    каждый в своей сессии. При значении 1 посылки записываются последовательно в одной сессии
+
+    INGESTION_WORKERS: int - число обработчиков асинхронных задач загрузки
+
+    INGESTION_QUEUE_SIZE: int - максимальное число задач загрузки в очереди
+
+    INGESTION_JOB_HISTORY: int - число задач загрузки, состояние которых хранится в памяти
+
+    FAST_SERIALIZATION: bool - сериализация ответов со списками пользователей без повторной валидации
+
+    DB_POOL_SIZE: int - число постоянных соединений в пуле, открываются при запуске сервера
+
+    DB_MAX_OVERFLOW: int - число дополнительных соединений сверх DB_POOL_SIZE
+
+    DB_POOL_TIMEOUT: float - время ожидания свободного соединения из пула в секундах
+
+    DB_POOL_RECYCLE: int - время в секундах, после которого соединение переоткрывается.
+    Должно быть меньше wait_timeout MySQL
+
+    DB_POOL_PRE_PING: bool - проверка соединения перед выдачей из пула
+
+    REPLICA_HOST: str - хост реплики базы данных для чтения. Если не задан, все запросы выполняются на основной базе
+
+    REPLICA_PORT: int - порт реплики, по умолчанию MYSQL_PORT
+
+    REPLICA_USER: str - имя пользователя реплики, по умолчанию MYSQL_USER
+
+    REPLICA_PASSWORD: str - пароль реплики, по умолчанию MYSQL_PASSWORD
+
+    REPLICA_DATABASE: str - имя базы данных реплики, по умолчанию MYSQL_DATABASE
+
+    REPLICA_CONNECT_TIMEOUT: int - время ожидания подключения к реплике в секундах
+
+    REPLICA_RETRY_INTERVAL: float - время в секундах, в течение которого после ошибки подключения
+    чтение выполняется на основной базе
+
+    PASSWORD_HASH_ITERATIONS: int - число итераций PBKDF2-SHA256 при хэшировании паролей
+
+    PASSWORD_HASH_WORKERS: int - число потоков хэширования паролей пользователей из посылок
+
+    PASSWORD_VERIFY_WORKERS: int - число потоков проверки паролей при входе и хэширования
+    паролей из запросов
+
+    PASSWORD_CACHE_TTL: float - время в секундах, в течение которого успешная проверка пароля
+    не повторяется
+
+    PASSWORD_CACHE_SIZE: int - максимальное число успешных проверок паролей в кэше процесса
+
+    CHANGES_MAX_LIMIT: int - максимальное число изменений в одном ответе ленты изменений
+
+    CHANGES_MAX_WAIT: float - максимальное время ожидания новых изменений в секундах
+
+    CHANGES_POLL_INTERVAL: float - интервал проверки изменений, записанных другими процессами,
+    во время ожидания в секундах
+
+    CHANGES_SEQUENCE_LOCK_TIMEOUT: float - время ожидания блокировки присвоения порядковых номеров
+    изменениям в секундах
+
+    REFERENCE_REFRESH_INTERVAL: float - интервал обновления справочников типов и полов в секундах
+
+    TOKEN_SECRET: str - ключ подписи токенов доступа. Если не задан, ключ создается при запуске
+    каждого процесса, и токены действуют только в выдавшем их процессе
+
+    TOKEN_TTL: int - срок действия токена доступа в секундах
+
+    TOKEN_REVOCATION_REFRESH: float - интервал загрузки отзывов токенов из базы данных в секундах
+
+    SERVER_HOST: str - адрес, на котором сервер принимает соединения
+
+    SERVER_PORT: int - порт сервера
+
+    WORKERS: int - число процессов сервера в рабочем режиме (server.py)
+
+    SERVER_BACKLOG: int - максимальная длина очереди входящих соединений
+
+    TIMEOUT_KEEP_ALIVE: int - время в секундах, в течение которого открыто неактивное keep-alive соединение
+
+    TIMEOUT_GRACEFUL_SHUTDOWN: int - время в секундах на завершение обрабатываемых запросов при остановке
+
+    DEBUG: bool - режим отладки: число и время SQL запросов добавляются в заголовки ответов и в лог
+
     DATABASE_URL: str - url для подключения к базе данных
+
+    REPLICA_DATABASE_URL: str - url для подключения к реплике или None
     """
 
     MYSQL_HOST: str
@@ -30,11 +123,64 @@ class Settings(BaseSettings):
     MYSQL_PASSWORD: str
     MYSQL_DATABASE: str
     PAGE_SIZE: int
+    INSERT_CHUNK_SIZE: int = 1000
+    ORGANIZATION_CACHE_SIZE: int = 1024
+    DELETE_CHUNK_SIZE: int = 1000
+    STREAM_CHUNK_SIZE: int = 500
+    INGESTION_CONCURRENCY: int = 1
+    INGESTION_WORKERS: int = 2
+    INGESTION_QUEUE_SIZE: int = 100
+    INGESTION_JOB_HISTORY: int = 1000
+    FAST_SERIALIZATION: bool = False
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 30
+    DB_POOL_RECYCLE: int = 3600
+    DB_POOL_PRE_PING: bool = True
+    REPLICA_HOST: Optional[str] = None
+    REPLICA_PORT: Optional[int] = None
+    REPLICA_USER: Optional[str] = None
+    REPLICA_PASSWORD: Optional[str] = None
+    REPLICA_DATABASE: Optional[str] = None
+    REPLICA_CONNECT_TIMEOUT: int = 2
+    REPLICA_RETRY_INTERVAL: float = 30
+    PASSWORD_HASH_ITERATIONS: int = 100_000
+    PASSWORD_HASH_WORKERS: int = 4
+    PASSWORD_VERIFY_WORKERS: int = 2
+    PASSWORD_CACHE_TTL: float = 60
+    PASSWORD_CACHE_SIZE: int = 1024
+    CHANGES_MAX_LIMIT: int = 1000
+    CHANGES_MAX_WAIT: float = 30
+    CHANGES_POLL_INTERVAL: float = 1
+    CHANGES_SEQUENCE_LOCK_TIMEOUT: float = 10
+    REFERENCE_REFRESH_INTERVAL: float = 300
+    TOKEN_SECRET: Optional[str] = None
+    TOKEN_TTL: int = 900
+    TOKEN_REVOCATION_REFRESH: float = 5
+    SERVER_HOST: str = "0.0.0.0"
+    SERVER_PORT: int = 8000
+    WORKERS: int = 1
+    SERVER_BACKLOG: int = 2048
+    TIMEOUT_KEEP_ALIVE: int = 5
+    TIMEOUT_GRACEFUL_SHUTDOWN: int = 30
+    DEBUG: bool = False
 
     @property
     def DATABASE_URL(self):
         return f"mysql+aiomysql://{self.MYSQL_USER}:{self.MYSQL_PASSWORD}@{self.MYSQL_HOST}:{self.MYSQL_PORT}/{self.MYSQL_DATABASE}"
 
+    @property
+    def REPLICA_DATABASE_URL(self):
+        if not self.REPLICA_HOST:
+            return None
+        user = self.REPLICA_USER or self.MYSQL_USER
+        password = self.REPLICA_PASSWORD or self.MYSQL_PASSWORD
+        port = self.REPLICA_PORT or self.MYSQL_PORT
+        database = self.REPLICA_DATABASE or self.MYSQL_DATABASE
+        return (
+            f"mysql+aiomysql://{user}:{password}@{self.REPLICA_HOST}:{port}/{database}"
+        )
+
     model_config = SettingsConfigDict(env_file="env_template", extra="ignore")
 
 
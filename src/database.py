@@ -2,18 +2,82 @@
 Модуль database содержит вспомогательные функции и классы для работы с базой данных.
 """
 
+import time
+from contextlib import AsyncExitStack
+from sqlalchemy import text
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from config import settings
 from sqlalchemy.orm import DeclarativeBase
 
+
+def create_engine(url: str, **kwargs):
+    """
+    Функция создания движка с параметрами пула из настроек.
+    :param url: url для подключения к базе данных.
+    :return AsyncEngine
+    """
+    return create_async_engine(
+        url=url,
+        echo=False,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        pool_recycle=settings.DB_POOL_RECYCLE,
+        pool_pre_ping=settings.DB_POOL_PRE_PING,
+        **kwargs,
+    )
+
+
 # Движок для работы с базой данных
-engine = create_async_engine(
-    url=settings.DATABASE_URL, echo=False, pool_size=5, max_overflow=10
-)
+engine = create_engine(settings.DATABASE_URL)
 
 # Фабричный метод для получения сессий для работы с базой данных
 session_factory = async_sessionmaker(engine)
 
+# Движок и фабричный метод для получения сессий реплики, если она задана в настройках
+replica_engine = None
+replica_session_factory = None
+if settings.REPLICA_DATABASE_URL:
+    replica_engine = create_engine(
+        settings.REPLICA_DATABASE_URL,
+        connect_args={"connect_timeout": settings.REPLICA_CONNECT_TIMEOUT},
+    )
+    replica_session_factory = async_sessionmaker(replica_engine)
+
+# Время, до которого реплика считается недоступной
+_replica_retry_at = 0.0
+
+
+def replica_available():
+    """
+    Функция проверки, можно ли выполнять чтение на реплике.
+    :return bool
+    """
+    return replica_engine is not None and time.monotonic() >= _replica_retry_at
+
+
+def mark_replica_unavailable():
+    """
+    Функция отключения чтения с реплики на REPLICA_RETRY_INTERVAL секунд.
+    """
+    global _replica_retry_at
+    _replica_retry_at = time.monotonic() + settings.REPLICA_RETRY_INTERVAL
+
+
+async def warm_up_pool(target=None, connections: int = settings.DB_POOL_SIZE):
+    """
+    Функция открытия и проверки постоянных соединений пула.
+    Соединения удерживаются одновременно, поэтому пул создает каждое из них,
+    после проверки запросом SELECT 1 они возвращаются в пул.
+    :param target: движок, по умолчанию движок основной базы.
+    :param connections: число соединений.
+    """
+    target = target or engine
+    async with AsyncExitStack() as stack:
+        for _ in range(connections):
+            connection = await stack.enter_async_context(target.connect())
+            await connection.execute(text("SELECT 1"))
+
 
 # Класс содержащий различные методанные для работы с моделями в базе
 # Метод repr переопределен для удобного отображения моделей в логах
@@ -2,48 +2,125 @@
 Модуль depends содержит функции, которые используются в качестве зависимостей.
 """
 
-from fastapi import Depends, Header
-from typing import Annotated
+import asyncio
+import logging
+import time
+from fastapi import Depends, Header, Request
+from typing import Annotated, Optional
+from sqlalchemy import event
+from sqlalchemy.exc import DBAPIError, TimeoutError as PoolTimeout
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import ORMExecuteState, Session
 from exceptions import BadAuthorization, NotAdmin
-from database import session_factory
+from database import (
+    engine,
+    mark_replica_unavailable,
+    replica_available,
+    replica_session_factory,
+    session_factory,
+)
+from metrics import db_pool_wait
 from queries import (
     get_user_auth_by_login_and_password,
 )
+from tokens import verify_token
+
+logger = logging.getLogger()
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _connect_on_first_use(orm_execute_state: ORMExecuteState):
+    """
+    Функция получения соединения из пула перед первым запросом сессии get_session.
+    Время ожидания соединения учитывается в метриках. Если подключиться к реплике не удалось,
+    она отключается на REPLICA_RETRY_INTERVAL секунд, а сессия переключается на основную базу.
+    """
+    session = orm_execute_state.session
+    name = session.info.pop("database", None)
+    if name is None:
+        return
+    started = time.perf_counter()
+    try:
+        session.connection()
+    except (DBAPIError, PoolTimeout, OSError, asyncio.TimeoutError) as exc:
+        if name != "replica":
+            raise
+        logger.error(f"Replica is unavailable. {exc}")
+        mark_replica_unavailable()
+        session.rollback()
+        session.bind = engine.sync_engine
+        name = "primary"
+        session.connection()
+    db_pool_wait.observe(time.perf_counter() - started, name)
 
 
-async def get_session():
+async def get_session(request: Request):
     """
     Функция для получения сессий, для работы с базой данных.
     По заврешении работы с сессией, она автоматически закрывается.
+    Соединение берется из пула при первом запросе сессии, поэтому запросы,
+    которым база не нужна (например, авторизованные токеном), не занимают соединение.
+    Для GET запросов выдается сессия реплики, если она задана в настройках и доступна.
+    Заголовок X-Read-Primary: true закрепляет чтение за основной базой,
+    чтобы сразу прочитать только что записанные данные.
+    Если при первом запросе подключиться к реплике не удалось, она отключается
+    на REPLICA_RETRY_INTERVAL секунд, а запрос выполняется на основной базе.
     """
+    if (
+        request.method == "GET"
+        and request.headers.get("X-Read-Primary", "").lower() not in ("1", "true")
+        and replica_available()
+    ):
+        session = replica_session_factory(info={"database": "replica"})
+    else:
+        session = session_factory(info={"database": "primary"})
     try:
-        session = session_factory()
         yield session
     finally:
         await session.close()
 
 
+def bearer_token(authorization: Optional[str]):
+    """
+    Функция получения токена из заголовка Authorization: Bearer <токен>.
+    :return str или None
+    """
+    if authorization:
+        scheme, _, token = authorization.partition(" ")
+        if scheme.lower() == "bearer" and token:
+            return token.strip()
+    return None
+
+
 async def authorization(
-    login: Annotated[str, Header()],
-    password: Annotated[str, Header()],
+    login: Annotated[Optional[str], Header()] = None,
+    password: Annotated[Optional[str], Header()] = None,
+    token: Annotated[Optional[str], Header(alias="Authorization")] = None,
     session: AsyncSession = Depends(get_session),
 ):
     """
     Функция для авторизации.
+    Если передан заголовок Authorization: Bearer <токен>, пользователь берется из токена
+    без запроса к базе данных. Иначе пользователь ищется по логину и паролю.
     :param login: Логин, тип str. Получен из заголовка login.
     :param password: Пароль, тип str. Получен из заголовка password.
+    :param token: Значение заголовка Authorization.
     param password: Сессия, для работы с базой данных. Получен из функции в Depends.
     :return UserAuth: Возвращает объект пользователя
     """
-
+    bearer = bearer_token(token)
+    if bearer:
+        return verify_token(bearer)
+    if login is None or password is None:
+        raise BadAuthorization
     user = await get_user_auth_by_login_and_password(login, password, session)
     return user
 
 
 async def admin_authorization(
-    login: Annotated[str, Header()],
-    password: Annotated[str, Header()],
+    login: Annotated[Optional[str], Header()] = None,
+    password: Annotated[Optional[str], Header()] = None,
+    token: Annotated[Optional[str], Header(alias="Authorization")] = None,
     session: AsyncSession = Depends(get_session),
 ):
     """
@@ -51,11 +128,12 @@ async def admin_authorization(
     которое обрабатывается специальным хендлером.
     :param login: Логин, тип str. Получен из заголовка login.
     :param password: Пароль, тип str. Получен из заголовка password.
+    :param token: Значение заголовка Authorization.
     param password: Сессия, для работы с базой данных. Получен из функции в Depends.
     :return UserAuth: Возвращает объект пользователя.
     """
     try:
-        user = await get_user_auth_by_login_and_password(login, password, session)
+        user = await authorization(login, password, token, session)
         if user.type_id != 1:
             raise NotAdmin
         return user
@@ -43,3 +43,45 @@ class NotAdmin(Exception):
     """
 
     pass
+
+
+class JobNotFound(Exception):
+    """
+    Класс исключение для обработки ошибки не найденной задачи загрузки.
+    """
+
+    pass
+
+
+class JobQueueFull(Exception):
+    """
+    Класс исключение для обработки переполнения очереди задач загрузки.
+    """
+
+    pass
+
+
+class AsyncIngestionUnavailable(Exception):
+    """
+    Класс исключение для обработки асинхронной загрузки при запуске сервера несколькими процессами.
+    """
+
+    pass
+
+
+class ReferenceNotLoaded(Exception):
+    """
+    Класс исключение для обработки проверки по справочникам до их загрузки.
+    """
+
+    pass
+
+
+class PackageConflict(Exception):
+    """
+    Класс исключение для обработки повторной посылки с измененным содержимым.
+    """
+
+    def __init__(self, message: str, *args: object) -> None:
+        self.message = message
+        super().__init__(*args)
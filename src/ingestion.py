@@ -0,0 +1,513 @@
+"""
+Модуль ingestion содержит функции обработки посылок: полной загрузки списка
+посылок и потоковой загрузки в формате NDJSON.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import uuid
+from typing import AsyncIterator, Callable, List, Optional
+from pydantic import ValidationError
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import session_factory
+from exceptions import BadValidation, PackageConflict
+from passwords import hash_passwords
+from queries import (
+    INTEGRITY_ERROR_MESSAGE,
+    claim_package_blocks,
+    create_users_bulk,
+    create_users_partial,
+    get_processed_packages,
+    get_written_user_ids,
+    resolve_organizations,
+    save_block_outcomes,
+)
+from schemas import DataSchema, Package, User
+
+logger = logging.getLogger()
+
+
+def package_hash(package: Package):
+    """
+    Функция вычисления SHA-256 содержимого посылки.
+    :param package: объект класса Package.
+    :return str
+    """
+    return hashlib.sha256(package.model_dump_json().encode()).hexdigest()
+
+
+class PackageBlock:
+    """
+    Класс PackageBlock. Представляет собой данные одного отправителя посылки.
+
+    package - посылка
+
+    index - номер отправителя в посылке
+
+    data - данные отправителя
+
+    payload_hash - SHA-256 содержимого посылки
+
+    password_hashes - хэши паролей пользователей, заполняются функцией hash_passwords до записи
+    """
+
+    def __init__(
+        self, package: Package, index: int, data: DataSchema, payload_hash: str
+    ):
+        self.package = package
+        self.index = index
+        self.data = data
+        self.payload_hash = payload_hash
+        self.password_hashes = None
+
+    @property
+    def key(self):
+        return self.package.referralGUID, self.index
+
+    async def hash_passwords(self):
+        """
+        Функция хэширования паролей пользователей отправителя.
+        Вызывается до начала транзакции записи, чтобы хэширование не удлиняло транзакцию.
+        """
+        self.password_hashes = await hash_passwords(
+            [user.Credentials.password for user in self.data.Users]
+        )
+
+    def claim_row(self):
+        """
+        Функция формирования строки отметки о записи блока.
+        :return dict
+        """
+        return dict(
+            referral_guid=self.package.referralGUID,
+            data_index=self.index,
+            package_id=self.package.id,
+            payload_hash=self.payload_hash,
+        )
+
+    async def write(
+        self, creator_id: int, session: AsyncSession, partial: bool = False
+    ):
+        """
+        Функция записи пользователей отправителя.
+        В режиме partial ошибочные пользователи пропускаются, для каждого пользователя
+        возвращается результат записи. Результаты сохраняются в отметке о записи блока.
+        :return (int, list[dict]): число записанных строк и результаты по пользователям.
+        """
+        arguments = (
+            self.data.Users,
+            self.password_hashes,
+            creator_id,
+            self.data.Sender.Organization.fullName,
+            self.package.id,
+            self.package.referralDate,
+            session,
+        )
+        if not partial:
+            return await create_users_bulk(*arguments), []
+        rows, outcomes = await create_users_partial(*arguments)
+        await save_block_outcomes(*self.key, outcomes, session)
+        return rows, self.user_outcomes(outcomes)
+
+    def user_outcomes(self, outcomes: Optional[List[dict]] = None):
+        """
+        Функция добавления ГУИД посылки и отправителя к результатам по пользователям.
+        Блок, записанный без partial, записан целиком, поэтому при outcomes = None
+        все пользователи считаются созданными.
+        :return list[dict]
+        """
+        if outcomes is None:
+            outcomes = [
+                {"id": user.id, "status": "created"} for user in self.data.Users
+            ]
+        sender = self.data.Sender.Organization.fullName
+        return [
+            {"referralGUID": self.package.referralGUID, "sender": sender, **outcome}
+            for outcome in outcomes
+        ]
+
+    def error(self, message: str):
+        """
+        Функция формирования описания ошибки записи блока.
+        :return dict
+        """
+        return {
+            "referralGUID": self.package.referralGUID,
+            "sender": self.data.Sender.Organization.fullName,
+            "index": self.index,
+            "detail": message,
+        }
+
+
+async def plan_blocks(packages: List[Package], session: AsyncSession):
+    """
+    Функция отбора блоков посылок, которые еще не записаны.
+    Уже записанные блоки всех посылок запроса проверяются одним запросом.
+    :param packages: список объектов класса Package.
+    :param session: сессия работы с базой данных.
+    :return (List[PackageBlock], List[str], List[dict]): блоки для записи, ГУИД полностью
+    записанных ранее посылок и сохраненные результаты по пользователям записанных ранее блоков.
+    """
+    hashes = {}
+    unique_packages = []
+    for package in packages:
+        payload_hash = package_hash(package)
+        if package.referralGUID in hashes:
+            if hashes[package.referralGUID] != payload_hash:
+                raise PackageConflict(
+                    f"Посылка {package.referralGUID} передана несколько раз с разным содержимым."
+                )
+            continue
+        hashes[package.referralGUID] = payload_hash
+        unique_packages.append(package)
+    processed = await get_processed_packages(list(hashes), session)
+    for (referral_guid, _), (payload_hash, _) in processed.items():
+        if hashes[referral_guid] != payload_hash:
+            raise PackageConflict(
+                f"Посылка {referral_guid} уже записана с другим содержимым."
+            )
+    blocks = []
+    skipped = []
+    outcomes = []
+    for package in unique_packages:
+        package_blocks = [
+            PackageBlock(package, index, data, hashes[package.referralGUID])
+            for index, data in enumerate(package.Data or [])
+        ]
+        pending = []
+        for block in package_blocks:
+            if block.key in processed:
+                outcomes.extend(block.user_outcomes(processed[block.key][1]))
+            else:
+                pending.append(block)
+        if package_blocks and not pending:
+            skipped.append(package.referralGUID)
+        blocks.extend(pending)
+    return blocks, skipped, outcomes
+
+
+async def ingest_packages(
+    packages: List[Package],
+    creator_id: int,
+    session: AsyncSession,
+    on_commit: Optional[Callable[[int], None]] = None,
+    concurrency: int = 1,
+    partial: bool = False,
+):
+    """
+    Функция записи списка посылок. Данные каждого отправителя посылки (блок Data) записываются
+    вместе с отметкой в таблице processed_packages, поэтому повторно отправленная посылка
+    подтверждается без записи пользователей и документов.
+    Уже записанные блоки всех посылок запроса проверяются одним запросом до начала записи,
+    пароли пользователей хэшируются до начала транзакций записи.
+    Если тот же блок одновременно записывает другой запрос, текущий запрос ожидает его завершения.
+    Если посылка с тем же ГУИД записана с другим содержимым, выбрасывается PackageConflict.
+
+    При concurrency = 1 каждая посылка фиксируется отдельной транзакцией в переданной сессии.
+    При concurrency > 1 блоки записываются одновременно, каждый в своей сессии и транзакции,
+    но не более concurrency блоков сразу.
+    Ошибка проверки данных или нарушение ограничений базы в одной посылке (при concurrency > 1
+    в одном блоке) не прерывает запись остальных, ошибки возвращаются в поле errors.
+    Прочие ошибки выбрасываются, при concurrency > 1 после завершения записи всех блоков.
+
+    При partial = True каждый пользователь записывается внутри точки сохранения (SAVEPOINT):
+    пользователи с неверными документами или повторяющимся логином пропускаются,
+    остальные фиксируются. Результат по каждому пользователю возвращается в поле users.
+    Блок отмечается записанным вместе с результатами по пользователям, поэтому повторная отправка
+    посылки возвращает те же результаты, а пропущенных пользователей отправляют в новой посылке.
+    :param packages: список объектов класса Package.
+    :param creator_id: id пользователя создателя записи.
+    :param session: сессия работы с базой данных.
+    :param on_commit: функция, которая вызывается после каждой транзакции с числом записанных строк.
+    :param concurrency: максимальное число одновременно записываемых блоков.
+    :param partial: пропускать ошибочных пользователей вместо отмены записи.
+    :return dict: число записанных строк, ГУИД записанных ранее посылок, список ошибок
+    и результаты по пользователям.
+    """
+    blocks, skipped, written_outcomes = await plan_blocks(packages, session)
+    # пароли хэшируются после завершения читающей транзакции и до начала записи
+    await session.commit()
+    for block in blocks:
+        await block.hash_passwords()
+    await resolve_organizations(
+        [block.data.Sender.Organization for block in blocks], creator_id, session
+    )
+    # организации фиксируются до записи блоков: они должны быть видны сессиям блоков
+    # и не откатываться вместе с посылкой, запись которой завершилась ошибкой
+    await session.commit()
+    result = {
+        "rows": 0,
+        "skipped": skipped,
+        "errors": [],
+        "users": written_outcomes if partial else [],
+    }
+    request_token = uuid.uuid4().hex
+
+    def committed(rows: int, outcomes: list):
+        result["rows"] += rows
+        result["users"].extend(outcomes)
+        if on_commit:
+            on_commit(result["rows"])
+
+    if concurrency <= 1:
+        packages_blocks = {}
+        for block in blocks:
+            packages_blocks.setdefault(block.package.referralGUID, []).append(block)
+        for package_blocks in packages_blocks.values():
+            try:
+                claimed, written = await claim_package_blocks(
+                    [block.claim_row() for block in package_blocks],
+                    request_token,
+                    creator_id,
+                    session,
+                )
+                rows = 0
+                outcomes = []
+                for block in package_blocks:
+                    if block.key in claimed:
+                        block_rows, block_outcomes = await block.write(
+                            creator_id, session, partial
+                        )
+                        rows += block_rows
+                        outcomes.extend(block_outcomes)
+                    elif partial:
+                        outcomes.extend(block.user_outcomes(written.get(block.key)))
+                await session.commit()
+            except (BadValidation, PackageConflict) as exc:
+                await session.rollback()
+                result["errors"].extend(
+                    block.error(exc.message) for block in package_blocks
+                )
+                continue
+            except IntegrityError as exc:
+                await session.rollback()
+                logger.error(f"Package {package_blocks[0].package.referralGUID}. {exc}")
+                result["errors"].extend(
+                    block.error(INTEGRITY_ERROR_MESSAGE) for block in package_blocks
+                )
+                continue
+            if not claimed:
+                result["skipped"].append(package_blocks[0].package.referralGUID)
+            committed(rows, outcomes)
+        return result
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def write_block(block: PackageBlock):
+        async with semaphore, session_factory() as block_session:
+            try:
+                claimed, written = await claim_package_blocks(
+                    [block.claim_row()], request_token, creator_id, block_session
+                )
+                rows, outcomes = 0, []
+                if block.key in claimed:
+                    rows, outcomes = await block.write(
+                        creator_id, block_session, partial
+                    )
+                elif partial:
+                    outcomes = block.user_outcomes(written.get(block.key))
+                await block_session.commit()
+                committed(rows, outcomes)
+            except (BadValidation, PackageConflict) as exc:
+                await block_session.rollback()
+                result["errors"].append(block.error(exc.message))
+            except IntegrityError as exc:
+                await block_session.rollback()
+                logger.error(f"Package {block.package.referralGUID}. {exc}")
+                result["errors"].append(block.error(INTEGRITY_ERROR_MESSAGE))
+            except:
+                await block_session.rollback()
+                raise
+
+    # остальные блоки дописываются до конца, затем ошибка сервера передается обработчику
+    failures = await asyncio.gather(
+        *(write_block(block) for block in blocks), return_exceptions=True
+    )
+    for failure in failures:
+        if failure is not None:
+            raise failure
+    result["errors"].sort(key=lambda error: (error["referralGUID"], error["index"]))
+    return result
+
+
+async def iter_ndjson_lines(chunks: AsyncIterator[bytes]):
+    """
+    Функция разбиения потока байт на строки NDJSON. Пустые строки пропускаются.
+    Конец строки ищется только в новой части, начало незавершенной строки
+    хранится списком частей, поэтому время разбиения линейно от размера тела.
+    :param chunks: асинхронный итератор частей тела запроса.
+    :return (int, bytes): номер строки и её содержимое.
+    """
+    parts = []
+    line_number = 0
+    async for chunk in chunks:
+        start = 0
+        end = chunk.find(b"\n")
+        while end != -1:
+            parts.append(chunk[start:end])
+            line = b"".join(parts)
+            parts = []
+            line_number += 1
+            if line.strip():
+                yield line_number, line
+            start = end + 1
+            end = chunk.find(b"\n", start)
+        if start < len(chunk):
+            parts.append(chunk[start:])
+    line = b"".join(parts)
+    if line.strip():
+        yield line_number + 1, line
+
+
+class StreamIngestion:
+    """
+    Класс StreamIngestion. Потоковая загрузка посылок из записей NDJSON.
+
+    Каждая строка содержит либо посылку (Package), либо пользователя (User).
+    Пользователь относится к последнему отправителю последней переданной посылки,
+    поэтому большую посылку можно передать строкой посылки с пустым списком Users
+    и следующими за ней строками пользователей.
+    Пользователи накапливаются до chunk_size и записываются отдельной транзакцией,
+    поэтому потребление памяти зависит от размера части, а не от размера запроса.
+    Организации посылки фиксируются сразу, пароли части хэшируются до начала транзакции записи.
+    Пользователи, уже записанные с теми же id и логином, пропускаются, поэтому повторная
+    отправка всего тела или его продолжения не записывает пользователей повторно.
+    Нарушение ограничений базы при записи части выбрасывается как BadValidation.
+
+    chunks - отчеты о записанных частях.
+    """
+
+    def __init__(self, creator_id: int, session: AsyncSession, chunk_size: int):
+        self.creator_id = creator_id
+        self.session = session
+        self.chunk_size = chunk_size
+        self.chunks = []
+        self.lines = 0
+        self.users = 0
+        self.skipped = 0
+        self._sender = None
+        self._pending = []
+        self._pending_users = 0
+
+    def _add_users(self, users: List[User]):
+        if not users:
+            return
+        sender_name, package = self._sender
+        if (
+            self._pending
+            and self._pending[-1][0] == sender_name
+            and self._pending[-1][1] is package
+        ):
+            self._pending[-1][2].extend(users)
+        else:
+            self._pending.append((sender_name, package, list(users)))
+        self._pending_users += len(users)
+
+    async def add_record(self, line_number: int, line: bytes):
+        """
+        Функция обработки одной строки NDJSON.
+        :param line_number: номер строки.
+        :param line: содержимое строки.
+        """
+        try:
+            record = json.loads(line)
+            if not isinstance(record, dict):
+                raise BadValidation(f"Неверный формат данных в строке {line_number}.")
+            if "referralGUID" in record:
+                package = Package.model_validate(record)
+                await resolve_organizations(
+                    [data.Sender.Organization for data in package.Data or []],
+                    self.creator_id,
+                    self.session,
+                )
+                await self.session.commit()
+                for data in package.Data or []:
+                    self._sender = (data.Sender.Organization.fullName, package)
+                    self._add_users(data.Users)
+            elif self._sender is None:
+                raise BadValidation(
+                    f"Пользователь в строке {line_number} передан до посылки с отправителем."
+                )
+            else:
+                self._add_users([User.model_validate(record)])
+        except json.JSONDecodeError:
+            raise BadValidation(f"Неверный формат JSON в строке {line_number}.")
+        except ValidationError as exc:
+            error = exc.errors()[0]
+            raise BadValidation(
+                f"Неверный формат данных в строке {line_number}. {error['loc'][-1]} : {error['input']}"
+            )
+        self.lines = line_number
+        if self._pending_users >= self.chunk_size:
+            await self.flush()
+
+    async def flush(self):
+        """
+        Функция записи накопленных пользователей одной транзакцией.
+        """
+        if not self._pending:
+            await self.session.commit()
+            return
+        written = await get_written_user_ids(
+            [user for _, _, users in self._pending for user in users], self.session
+        )
+        await self.session.commit()
+        pending = [
+            (sender_name, package, [user for user in users if user.id not in written])
+            for sender_name, package, users in self._pending
+        ]
+        # пароли всей части хэшируются до начала транзакции записи
+        password_hashes = [
+            await hash_passwords([user.Credentials.password for user in users])
+            for _, _, users in pending
+        ]
+        rows = 0
+        try:
+            for (sender_name, package, users), user_hashes in zip(
+                pending, password_hashes
+            ):
+                if users:
+                    rows += await create_users_bulk(
+                        users,
+                        user_hashes,
+                        self.creator_id,
+                        sender_name,
+                        package.id,
+                        package.referralDate,
+                        self.session,
+                    )
+            await self.session.commit()
+        except IntegrityError as exc:
+            await self.session.rollback()
+            logger.error(f"Stream ingestion, line {self.lines}. {exc}")
+            raise BadValidation(INTEGRITY_ERROR_MESSAGE)
+        users_count = sum(len(users) for _, _, users in pending)
+        skipped = self._pending_users - users_count
+        self.users += users_count
+        self.skipped += skipped
+        self.chunks.append(
+            {
+                "chunk": len(self.chunks) + 1,
+                "line": self.lines,
+                "users": users_count,
+                "skipped": skipped,
+                "rows": rows,
+            }
+        )
+        self._pending = []
+        self._pending_users = 0
+
+    def report(self):
+        """
+        Функция формирования отчета о загрузке.
+        :return dict
+        """
+        return {
+            "lines": self.lines,
+            "users": self.users,
+            "skipped": self.skipped,
+            "chunks": self.chunks,
+        }
@@ -0,0 +1,214 @@
+"""
+Модуль jobs содержит очередь асинхронных задач загрузки посылок.
+
+Задачи и их состояния хранятся в памяти процесса, поэтому состояние задачи можно получить
+только у процесса, принявшего посылку. При WORKERS > 1 запросы распределяются между процессами,
+и асинхронная загрузка отклоняется.
+"""
+
+import asyncio
+import datetime
+import logging
+import uuid
+from typing import List
+from common import BoundedCache
+from config import settings
+from database import session_factory
+from sqlalchemy.exc import IntegrityError
+from exceptions import (
+    AsyncIngestionUnavailable,
+    BadValidation,
+    JobQueueFull,
+    PackageConflict,
+)
+from ingestion import ingest_packages
+from queries import INTEGRITY_ERROR_MESSAGE
+from schemas import JobShow, Package
+
+logger = logging.getLogger()
+
+
+class JobState:
+    """
+    Класс содержит состояния задачи загрузки.
+    """
+
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
+
+class IngestionJob:
+    """
+    Класс IngestionJob. Представляет собой задачу загрузки посылок.
+
+    id - id задачи
+
+    creator_id - id пользователя, создавшего задачу
+
+    packages - список посылок. Очищается после завершения задачи.
+
+    state - состояние задачи
+
+    rows - число записанных строк
+
+    errors - список ошибок
+
+    skipped - список ГУИД посылок, записанных ранее
+
+    partial - пропускать ошибочных пользователей вместо отмены записи.
+    Пропущенные пользователи добавляются в список ошибок.
+    """
+
+    def __init__(self, packages: List[Package], creator_id: int, partial: bool = False):
+        self.id = uuid.uuid4().hex
+        self.creator_id = creator_id
+        self.packages = packages
+        self.partial = partial
+        self.state = JobState.QUEUED
+        self.rows = 0
+        self.errors = []
+        self.skipped = []
+        self.create_datetime = datetime.datetime.now()
+        self.finish_datetime = None
+
+    def show(self):
+        """
+        Функция для преобразования задачи в pydantic модель для отправки в качестве ответа на запрос.
+        :return JobShow
+        """
+        return JobShow(
+            id=self.id,
+            state=self.state,
+            rows=self.rows,
+            errors=self.errors,
+            skipped=self.skipped,
+            create_datetime=self.create_datetime,
+            finish_datetime=self.finish_datetime,
+        )
+
+
+class JobQueue:
+    """
+    Класс JobQueue. Очередь задач загрузки и пул обработчиков в памяти процесса.
+    Число обработчиков задается отдельно от числа обрабатываемых сервером запросов,
+    каждый обработчик использует одно соединение с базой данных.
+
+    workers - число обработчиков
+
+    queue_size - максимальное число задач в очереди
+
+    history_size - число задач, состояние которых хранится после завершения
+    """
+
+    def __init__(self, workers: int, queue_size: int, history_size: int):
+        self.workers = workers
+        self.queue_size = queue_size
+        self._jobs = BoundedCache(history_size)
+        self._queue = None
+        self._tasks = []
+
+    def start(self):
+        """
+        Функция запуска обработчиков. Вызывается при запуске приложения.
+        """
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        """
+        Функция остановки обработчиков. Задачи, оставшиеся в очереди, не выполняются.
+        """
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def submit(self, packages: List[Package], creator_id: int, partial: bool = False):
+        """
+        Функция постановки посылок в очередь.
+        При WORKERS > 1 выбрасывается исключение AsyncIngestionUnavailable: запрос состояния задачи
+        может попасть в другой процесс сервера, который о задаче не знает.
+        :param packages: список объектов класса Package.
+        :param creator_id: id пользователя создателя записи.
+        :param partial: пропускать ошибочных пользователей вместо отмены записи.
+        :return IngestionJob
+        """
+        if settings.WORKERS > 1:
+            raise AsyncIngestionUnavailable
+        job = IngestionJob(packages, creator_id, partial)
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            raise JobQueueFull
+        self._jobs.set(job.id, job)
+        return job
+
+    def get(self, job_id: str):
+        """
+        Функция получения задачи по id.
+        :param job_id: id задачи.
+        :return IngestionJob или None
+        """
+        return self._jobs.get(job_id)
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            try:
+                await self._run(job)
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job: IngestionJob):
+        job.state = JobState.RUNNING
+
+        def on_commit(rows: int):
+            job.rows = rows
+
+        async with session_factory() as session:
+            try:
+                result = await ingest_packages(
+                    job.packages,
+                    job.creator_id,
+                    session,
+                    on_commit,
+                    settings.INGESTION_CONCURRENCY,
+                    job.partial,
+                )
+                job.skipped = result["skipped"]
+                job.errors.extend(
+                    f"{error['referralGUID']} {error['sender']}. {error['detail']}"
+                    for error in result["errors"]
+                )
+                job.errors.extend(
+                    f"{user['referralGUID']} {user['sender']}. Пользователь {user['id']}. {user['detail']}"
+                    for user in result["users"]
+                    if user["status"] == "failed"
+                )
+                job.state = JobState.FAILED if job.errors else JobState.DONE
+            except (BadValidation, PackageConflict) as exc:
+                await session.rollback()
+                job.errors.append(exc.message)
+                job.state = JobState.FAILED
+            except IntegrityError as exc:
+                await session.rollback()
+                logger.error(f"Ingestion job {job.id}. {exc}")
+                job.errors.append(INTEGRITY_ERROR_MESSAGE)
+                job.state = JobState.FAILED
+            except Exception as exc:
+                await session.rollback()
+                logger.error(f"Ingestion job {job.id}. {exc}")
+                job.errors.append("Внутренняя ошибка сервера.")
+                job.state = JobState.FAILED
+        job.packages = None
+        job.finish_datetime = datetime.datetime.now()
+
+
+# Очередь асинхронных задач загрузки посылок
+ingestion_jobs = JobQueue(
+    settings.INGESTION_WORKERS,
+    settings.INGESTION_QUEUE_SIZE,
+    settings.INGESTION_JOB_HISTORY,
+)
@@ -2,21 +2,119 @@
 Модуль main. Главный модуль для запуска сервера.
 """
 
-from fastapi import FastAPI, HTTPException
+import time
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.exceptions import RequestValidationError
 from sqlalchemy.exc import IntegrityError
 from exceptions import *
 
 import uvicorn
+from config import settings
+from changes import assign_sequence, change_sequencer
+from database import engine, mark_replica_unavailable, replica_engine, warm_up_pool
+from jobs import ingestion_jobs
+from reference import reference
+from tokens import revocations
+from metrics import (
+    count_exception,
+    http_request_duration,
+    http_requests_in_flight,
+    router as metrics_router,
+)
+from sql_stats import collect_statements
 from router import router as package_router
 import logging
 
 logger = logging.getLogger()
+if settings.DEBUG:
+    logging.basicConfig(level=logging.DEBUG)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Функция, выполняющая действия при запуске и остановке приложения.
+    Открывает постоянные соединения пулов основной базы и реплики до начала обработки запросов,
+    запускает и останавливает обработчики асинхронных задач загрузки
+    периодическую загрузку отзывов токенов доступа и обновление справочников.
+    Изменениям, оставшимся без порядкового номера после остановки процесса, номер присваивается при запуске.
+    """
+    if not settings.TOKEN_SECRET:
+        logger.warning(
+            "TOKEN_SECRET is not set. Access tokens are accepted only by this process."
+        )
+    await warm_up_pool()
+    if replica_engine is not None:
+        try:
+            await warm_up_pool(replica_engine)
+        except Exception as exc:
+            logger.error(f"Replica is unavailable. {exc}")
+            mark_replica_unavailable()
+    await reference.start()
+    await assign_sequence()
+    ingestion_jobs.start()
+    revocations.start()
+    yield
+    await revocations.stop()
+    await reference.stop()
+    await ingestion_jobs.stop()
+    await change_sequencer.stop()
+    await engine.dispose()
+    if replica_engine is not None:
+        await replica_engine.dispose()
+
 
 # приложение FastApi
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 # добавление роутера в приложение
 app.include_router(router=package_router)
+app.include_router(router=metrics_router)
+
+
+@app.middleware("http")
+async def metrics_middleware(request: Request, call_next):
+    """
+    Функция, добавляющая учет времени обработки и числа обрабатываемых запросов.
+    Запросы учитываются по шаблону пути эндпоинта.
+    """
+    method = request.method
+    http_requests_in_flight.inc(method)
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        http_request_duration.observe(
+            time.perf_counter() - started,
+            method,
+            route.path if route is not None else "unmatched",
+            status,
+        )
+        http_requests_in_flight.dec(method)
+
+
+@app.middleware("http")
+async def sql_stats_middleware(request: Request, call_next):
+    """
+    Функция, добавляющая учет SQL запросов, выполненных при обработке запроса.
+    В режиме отладки число и суммарное время запросов добавляются в заголовки
+    X-SQL-Statements и X-SQL-Time (в миллисекундах) и записываются в лог.
+    """
+    with collect_statements() as stats:
+        response = await call_next(request)
+    if settings.DEBUG:
+        sql_time = f"{stats.seconds * 1000:.2f}"
+        response.headers["X-SQL-Statements"] = str(stats.statements)
+        response.headers["X-SQL-Time"] = sql_time
+        logger.debug(
+            f"{request.method} {request.url.path}. "
+            f"SQL statements: {stats.statements}, time: {sql_time} ms"
+        )
+    return response
 
 
 @app.exception_handler(RequestValidationError)
@@ -24,6 +122,7 @@ async def request_validation_handler(request, exc: RequestValidationError):
     """
     Функция, добавляющая обработку исключения RequestValidationError.
     """
+    count_exception(exc)
     errors = exc.errors()
     logger.error(f"RequestValidationError. {errors}")
     loc = errors[0]["loc"][-1]
@@ -40,6 +139,7 @@ async def bad_authorization_handler(request, exc: BadAuthorization):
     """
     Функция, добавляющая обработку исключения BadAuthorization.
     """
+    count_exception(exc)
     raise HTTPException(
         detail="Неверный логин или пароль",
         status_code=400,
@@ -51,6 +151,7 @@ async def user_not_found_handler(request, exc: UserNotFound):
     """
     Функция, добавляющая обработку исключения UserNotFound.
     """
+    count_exception(exc)
     raise HTTPException(
         detail="Пользователь не существует",
         status_code=400,
@@ -62,6 +163,7 @@ async def document_not_exist_handler(request, exc: DocumentNotExist):
     """
     Функция, добавляющая обработку исключения DocumentNotExist.
     """
+    count_exception(exc)
     raise HTTPException(
         detail="Документ не существует",
         status_code=400,
@@ -73,16 +175,78 @@ async def document_not_exist_handler(request, exc: NotAdmin):
     """
     Функция, добавляющая обработку исключения NotAdmin.
     """
+    count_exception(exc)
     raise HTTPException(
         status_code=404,
     )
 
 
+@app.exception_handler(JobNotFound)
+async def job_not_found_handler(request, exc: JobNotFound):
+    """
+    Функция, добавляющая обработку исключения JobNotFound.
+    """
+    count_exception(exc)
+    raise HTTPException(
+        detail="Задача не существует",
+        status_code=400,
+    )
+
+
+@app.exception_handler(JobQueueFull)
+async def job_queue_full_handler(request, exc: JobQueueFull):
+    """
+    Функция, добавляющая обработку исключения JobQueueFull.
+    """
+    count_exception(exc)
+    raise HTTPException(
+        detail="Очередь задач загрузки заполнена, повторите запрос позже",
+        status_code=503,
+    )
+
+
+@app.exception_handler(AsyncIngestionUnavailable)
+async def async_ingestion_unavailable_handler(request, exc: AsyncIngestionUnavailable):
+    """
+    Функция, добавляющая обработку исключения AsyncIngestionUnavailable.
+    """
+    count_exception(exc)
+    raise HTTPException(
+        detail="Асинхронная загрузка недоступна при запуске сервера несколькими процессами",
+        status_code=501,
+    )
+
+
+@app.exception_handler(ReferenceNotLoaded)
+async def reference_not_loaded_handler(request, exc: ReferenceNotLoaded):
+    """
+    Функция, добавляющая обработку исключения ReferenceNotLoaded.
+    """
+    count_exception(exc)
+    raise HTTPException(
+        detail="Справочники не загружены, повторите запрос позже",
+        status_code=503,
+    )
+
+
+@app.exception_handler(PackageConflict)
+async def package_conflict_handler(request, exc: PackageConflict):
+    """
+    Функция, добавляющая обработку исключения PackageConflict.
+    """
+    count_exception(exc)
+    raise HTTPException(
+        detail=exc.message,
+        status_code=409,
+    )
+
+
 @app.exception_handler(BadValidation)
 async def bad_validation_handler(request, exc: BadValidation):
     """
     Функция, добавляющая обработку исключения BadValidation.
     """
+    count_exception(exc)
     raise HTTPException(
         detail=exc.message,
         status_code=400,
@@ -94,6 +258,7 @@ async def integrity_error_handler(request, exc: IntegrityError):
     """
     Функция, добавляющая обработку исключения IntegrityError.
     """
+    count_exception(exc)
     logger.error(f"IntegrityError. {exc}")
     raise HTTPException(
         status_code=500,
@@ -105,6 +270,7 @@ async def exception_handler(request, exc: Exception):
     """
     Функция, добавляющая обработку исключения Exception.
     """
+    count_exception(exc)
     logger.error(f"Exception. {exc}")
     raise HTTPException(
         status_code=500,
@@ -0,0 +1,288 @@
+"""
+Модуль metrics содержит метрики сервера и эндпоинт /metrics в текстовом формате Prometheus.
+Метрики хранятся в памяти процесса, поэтому при запуске нескольких процессов
+каждый процесс отдает только свои значения.
+"""
+
+import math
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from database import engine, replica_engine
+
+# Границы интервалов гистограмм задержек в секундах
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# Тип содержимого текстового формата Prometheus
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def format_value(value: float):
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def escape_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(names: tuple, values: tuple):
+    if not names:
+        return ""
+    labels = ",".join(
+        f'{name}="{escape_label(value)}"' for name, value in zip(names, values)
+    )
+    return "{" + labels + "}"
+
+
+class Metric:
+    """
+    Класс Metric. Базовый класс метрики с метками.
+
+    name - имя метрики
+
+    description - описание метрики
+
+    label_names - имена меток
+    """
+
+    type = None
+
+    def __init__(self, name: str, description: str, label_names: tuple = ()):
+        self.name = name
+        self.description = description
+        self.label_names = label_names
+        self._values = {}
+
+    def samples(self):
+        """
+        Функция получения значений метрики.
+        :return [(str, tuple, tuple, float)]: суффикс имени, имена меток, значения меток, значение.
+        """
+        return [
+            ("", self.label_names, labels, value)
+            for labels, value in self._values.items()
+        ]
+
+    def render(self):
+        """
+        Функция формирования описания метрики в текстовом формате Prometheus.
+        :return str
+        """
+        lines = [
+            f"# HELP {self.name} {self.description}",
+            f"# TYPE {self.name} {self.type}",
+        ]
+        for suffix, names, values, value in self.samples():
+            lines.append(
+                f"{self.name}{suffix}{format_labels(names, values)} {format_value(value)}"
+            )
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    """
+    Класс Counter. Счетчик, значение которого только увеличивается.
+    """
+
+    type = "counter"
+
+    def __init__(self, name: str, description: str, label_names: tuple = ()):
+        super().__init__(name, description, label_names)
+        if not label_names:
+            self._values[()] = 0
+
+    def inc(self, *labels, amount: float = 1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+
+class Gauge(Metric):
+    """
+    Класс Gauge. Метрика, значение которой может увеличиваться и уменьшаться.
+    Вместо хранимых значений может использоваться функция, которая вызывается
+    при формировании ответа и возвращает значения по меткам.
+    """
+
+    type = "gauge"
+
+    def __init__(
+        self, name: str, description: str, label_names: tuple = (), collect=None
+    ):
+        super().__init__(name, description, label_names)
+        self.collect = collect
+
+    def inc(self, *labels, amount: float = 1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, *labels, amount: float = 1):
+        self._values[labels] = self._values.get(labels, 0) - amount
+
+    def samples(self):
+        if self.collect is not None:
+            self._values = self.collect()
+        return super().samples()
+
+
+class Histogram(Metric):
+    """
+    Класс Histogram. Распределение значений по интервалам.
+
+    buckets - верхние границы интервалов
+    """
+
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        description: str,
+        label_names: tuple = (),
+        buckets: tuple = LATENCY_BUCKETS,
+    ):
+        super().__init__(name, description, label_names)
+        self.buckets = tuple(buckets) + (math.inf,)
+
+    def observe(self, value: float, *labels):
+        counts, total = self._values.get(labels, (None, 0))
+        if counts is None:
+            counts = [0] * len(self.buckets)
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[index] += 1
+                break
+        self._values[labels] = (counts, total + value)
+
+    def samples(self):
+        samples = []
+        bucket_names = self.label_names + ("le",)
+        for labels, (counts, total) in self._values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                samples.append(
+                    (
+                        "_bucket",
+                        bucket_names,
+                        labels + (format_value(bound),),
+                        cumulative,
+                    )
+                )
+            samples.append(("_sum", self.label_names, labels, total))
+            samples.append(("_count", self.label_names, labels, cumulative))
+        return samples
+
+
+def collect_pool_stats():
+    stats = {}
+    for name, target in (("primary", engine), ("replica", replica_engine)):
+        if target is None:
+            continue
+        pool = target.pool
+        stats[(name, "size")] = pool.size()
+        stats[(name, "checked_out")] = pool.checkedout()
+        stats[(name, "checked_in")] = pool.checkedin()
+        stats[(name, "overflow")] = max(pool.overflow(), 0)
+    return stats
+
+
+http_request_duration = Histogram(
+    "http_request_duration_seconds",
+    "Время обработки запросов по эндпоинтам.",
+    ("method", "route", "status"),
+)
+http_requests_in_flight = Gauge(
+    "http_requests_in_flight",
+    "Число обрабатываемых запросов.",
+    ("method",),
+)
+db_pool_connections = Gauge(
+    "db_pool_connections",
+    "Состояние пулов соединений с основной базой и репликой.",
+    ("engine", "state"),
+    collect=collect_pool_stats,
+)
+db_pool_wait = Histogram(
+    "db_pool_wait_seconds",
+    "Время ожидания соединения из пула.",
+    ("engine",),
+)
+ingested_users = Counter(
+    "ingested_users_total",
+    "Число записанных пользователей.",
+)
+ingested_documents = Counter(
+    "ingested_documents_total",
+    "Число записанных документов.",
+)
+handled_exceptions = Counter(
+    "handled_exceptions_total",
+    "Число исключений, обработанных хендлерами приложения.",
+    ("exception",),
+)
+
+registry = (
+    http_request_duration,
+    http_requests_in_flight,
+    db_pool_connections,
+    db_pool_wait,
+    ingested_users,
+    ingested_documents,
+    handled_exceptions,
+)
+
+
+def render_metrics():
+    """
+    Функция формирования всех метрик в текстовом формате Prometheus.
+    :return str
+    """
+    return "\n".join(metric.render() for metric in registry) + "\n"
+
+
+def count_exception(exc: Exception):
+    """
+    Функция учета исключения, обработанного хендлером.
+    :param exc: исключение.
+    """
+    handled_exceptions.inc(exc.__class__.__name__)
+
+
+def count_ingested(session: AsyncSession, users: int, documents: int):
+    """
+    Функция учета записанных пользователей и документов.
+    Значения добавляются к счетчикам только после фиксации транзакции сессии.
+    :param session: сессия работы с базой данных.
+    :param users: число пользователей.
+    :param documents: число документов.
+    """
+    pending_users, pending_documents = session.info.get("ingested", (0, 0))
+    session.info["ingested"] = (pending_users + users, pending_documents + documents)
+
+
+@event.listens_for(Session, "after_commit")
+def _ingested_after_commit(session: Session):
+    users, documents = session.info.pop("ingested", (0, 0))
+    if users:
+        ingested_users.inc(amount=users)
+    if documents:
+        ingested_documents.inc(amount=documents)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _ingested_after_rollback(session: Session, previous_transaction):
+    if not previous_transaction.nested:
+        session.info.pop("ingested", None)
+
+
+# Роутер с эндпоинтом метрик
+router = APIRouter()
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    return PlainTextResponse(render_metrics(), media_type=CONTENT_TYPE)
@@ -0,0 +1,91 @@
+"""003_documents_json
+
+Revision ID: 3a9d5c1e7b42
+Revises: 16bcd4a58f18
+Create Date: 2026-10-18 09:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import mysql
+
+# revision identifiers, used by Alembic.
+revision: str = "3a9d5c1e7b42"
+down_revision: Union[str, None] = "16bcd4a58f18"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.alter_column(
+        "documents",
+        "data",
+        existing_type=sa.Text(),
+        type_=mysql.JSON(),
+        existing_nullable=True,
+        existing_comment="Данные документов в формате JSON",
+        comment="Данные документов в формате JSON",
+    )
+    op.add_column(
+        "documents",
+        sa.Column(
+            "number",
+            sa.String(length=255),
+            sa.Computed(
+                "nullif(json_unquote(json_extract(`data`,'$.number')),'null')",
+                persisted=False,
+            ),
+            nullable=True,
+            comment="Номер документа",
+        ),
+    )
+    op.add_column(
+        "documents",
+        sa.Column(
+            "series",
+            sa.String(length=255),
+            sa.Computed(
+                "nullif(json_unquote(json_extract(`data`,'$.series')),'null')",
+                persisted=False,
+            ),
+            nullable=True,
+            comment="Серия документа",
+        ),
+    )
+    op.add_column(
+        "documents",
+        sa.Column(
+            "sender_name",
+            sa.String(length=255),
+            sa.Computed(
+                "nullif(json_unquote(json_extract(`data`,'$.senderName')),'null')",
+                persisted=False,
+            ),
+            nullable=True,
+            comment="Наименование организации отправителя",
+        ),
+    )
+    op.create_index("ix_documents_number", "documents", ["number"])
+    op.create_index("ix_documents_series", "documents", ["series"])
+    op.create_index("ix_documents_sender_name", "documents", ["sender_name"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_documents_sender_name", table_name="documents")
+    op.drop_index("ix_documents_series", table_name="documents")
+    op.drop_index("ix_documents_number", table_name="documents")
+    op.drop_column("documents", "sender_name")
+    op.drop_column("documents", "series")
+    op.drop_column("documents", "number")
+    op.alter_column(
+        "documents",
+        "data",
+        existing_type=mysql.JSON(),
+        type_=sa.Text(),
+        existing_nullable=True,
+        existing_comment="Данные документов в формате JSON",
+        comment="Данные документов в формате JSON",
+    )
@@ -0,0 +1,29 @@
+"""004_hot_path_indexes
+
+Revision ID: 8c2f4e6a1d93
+Revises: 3a9d5c1e7b42
+Create Date: 2026-10-18 09:30:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "8c2f4e6a1d93"
+down_revision: Union[str, None] = "3a9d5c1e7b42"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Документы пользователя выбираются и удаляются по (user_id, deleted):
+    # удаление пользователя, список пользователей с документами.
+    # Поиск документа по (id, user_id, deleted) обслуживается первичным ключом,
+    # авторизация по login - уникальным индексом логина.
+    op.create_index("ix_documents_user_id_deleted", "documents", ["user_id", "deleted"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_documents_user_id_deleted", table_name="documents")
@@ -0,0 +1,86 @@
+"""005_processed_packages
+
+Revision ID: 5b1e9d7c3a20
+Revises: 8c2f4e6a1d93
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import mysql
+
+# revision identifiers, used by Alembic.
+revision: str = "5b1e9d7c3a20"
+down_revision: Union[str, None] = "8c2f4e6a1d93"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Отметка о записи хранится для каждого отправителя посылки,
+    # чтобы блоки Data можно было записывать независимыми транзакциями.
+    # Результаты по пользователям блока, записанного в режиме partial,
+    # возвращаются при повторной отправке посылки.
+    op.create_table(
+        "processed_packages",
+        sa.Column(
+            "referral_guid",
+            sa.String(length=25),
+            nullable=False,
+            comment="ГУИД посылки",
+        ),
+        sa.Column(
+            "data_index",
+            mysql.INTEGER(display_width=11),
+            server_default="0",
+            nullable=False,
+            comment="Номер отправителя в посылке",
+        ),
+        sa.Column(
+            "package_id",
+            mysql.BIGINT(display_width=20),
+            nullable=False,
+            comment="id посылки",
+        ),
+        sa.Column(
+            "payload_hash",
+            sa.String(length=64),
+            nullable=False,
+            comment="SHA-256 содержимого посылки",
+        ),
+        sa.Column(
+            "request_token",
+            sa.String(length=32),
+            nullable=False,
+            comment="Токен запроса, записавшего посылку",
+        ),
+        sa.Column(
+            "outcomes",
+            sa.JSON(),
+            nullable=True,
+            comment="Результаты записи пользователей в режиме partial",
+        ),
+        sa.Column(
+            "create_user_id",
+            mysql.INTEGER(display_width=11),
+            nullable=True,
+            comment="Автор создания записи",
+        ),
+        sa.Column(
+            "create_datetime",
+            sa.DateTime(),
+            nullable=True,
+            comment="Дата и время создания записи",
+        ),
+        sa.ForeignKeyConstraint(["create_user_id"], ["users.id"], ondelete="SET NULL"),
+        sa.PrimaryKeyConstraint("referral_guid", "data_index"),
+        comment="Записанные посылки",
+        mysql_engine="InnoDB",
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("processed_packages")
@@ -0,0 +1,52 @@
+"""006_token_revocation
+
+Revision ID: 9e3b7f15c2a8
+Revises: 5b1e9d7c3a20
+Create Date: 2026-10-18 11:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import mysql
+
+# revision identifiers, used by Alembic.
+revision: str = "9e3b7f15c2a8"
+down_revision: Union[str, None] = "5b1e9d7c3a20"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Поколение токенов доступа увеличивается при изменении и удалении пользователя.
+    # Процессы сервера загружают отзывы за срок действия токена по индексу даты отзыва.
+    op.add_column(
+        "users",
+        sa.Column(
+            "token_generation",
+            mysql.INTEGER(display_width=11),
+            server_default="0",
+            nullable=False,
+            comment="Поколение токенов доступа",
+        ),
+    )
+    op.add_column(
+        "users",
+        sa.Column(
+            "token_revoked_datetime",
+            sa.DateTime(),
+            nullable=True,
+            comment="Дата и время последнего отзыва токенов",
+        ),
+    )
+    op.create_index(
+        "ix_users_token_revoked_datetime", "users", ["token_revoked_datetime"]
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_users_token_revoked_datetime", table_name="users")
+    op.drop_column("users", "token_revoked_datetime")
+    op.drop_column("users", "token_generation")
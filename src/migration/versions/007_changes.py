@@ -0,0 +1,80 @@
+"""007_changes
+
+Revision ID: 3f8a6d2e9b47
+Revises: 9e3b7f15c2a8
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import mysql
+
+# revision identifiers, used by Alembic.
+revision: str = "3f8a6d2e9b47"
+down_revision: Union[str, None] = "9e3b7f15c2a8"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # id выдается при добавлении записи, а транзакции фиксируются в другом порядке,
+    # поэтому лента читается по порядковому номеру, который присваивается после фиксации.
+    # Внешние ключи не создаются: запись об удалении должна пережить удаление записи.
+    op.create_table(
+        "changes",
+        sa.Column(
+            "id",
+            mysql.BIGINT(display_width=20),
+            autoincrement=True,
+            nullable=False,
+            comment="id записи",
+        ),
+        sa.Column(
+            "seq",
+            mysql.BIGINT(display_width=20),
+            nullable=True,
+            comment="Порядковый номер изменения",
+        ),
+        sa.Column(
+            "entity",
+            sa.String(length=16),
+            nullable=False,
+            comment="Тип измененной записи",
+        ),
+        sa.Column(
+            "entity_id",
+            mysql.INTEGER(display_width=11),
+            nullable=False,
+            comment="id измененной записи",
+        ),
+        sa.Column(
+            "user_id",
+            mysql.INTEGER(display_width=11),
+            nullable=True,
+            comment="id пользователя",
+        ),
+        sa.Column(
+            "action",
+            sa.String(length=16),
+            nullable=False,
+            comment="Действие",
+        ),
+        sa.Column(
+            "create_datetime",
+            sa.DateTime(),
+            nullable=False,
+            comment="Дата и время изменения",
+        ),
+        sa.PrimaryKeyConstraint("id"),
+        comment="Изменения пользователей и документов",
+        mysql_engine="InnoDB",
+    )
+    op.create_index("ix_changes_seq", "changes", ["seq"], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index("ix_changes_seq", table_name="changes")
+    op.drop_table("changes")
@@ -0,0 +1,44 @@
+"""008_document_required_fields
+
+Revision ID: 7d2b9e4f1a85
+Revises: 3f8a6d2e9b47
+Create Date: 2026-10-18 13:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "7d2b9e4f1a85"
+down_revision: Union[str, None] = "3f8a6d2e9b47"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Обязательные поля документа хранятся вместе с типом документа,
+    # поэтому новый тип документа добавляется без изменения кода.
+    op.add_column(
+        "document_types",
+        sa.Column(
+            "required_fields",
+            sa.JSON(),
+            nullable=True,
+            comment="Обязательные поля документа",
+        ),
+    )
+    op.execute(
+        "UPDATE document_types SET required_fields = "
+        "JSON_ARRAY('series', 'beginDate', 'orgDep_Name') WHERE id = 1"
+    )
+    op.execute(
+        "UPDATE document_types SET required_fields = "
+        "JSON_ARRAY('series', 'orgDep_Name') WHERE id = 2"
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("document_types", "required_fields")
@@ -0,0 +1,37 @@
+"""009_user_data_version
+
+Revision ID: 2a9c4e7b1d36
+Revises: 7d2b9e4f1a85
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "2a9c4e7b1d36"
+down_revision: Union[str, None] = "7d2b9e4f1a85"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Счетчик версии данных пользователя для ETag: тег читается из строки пользователя
+    # по индексу логина без обращения к документам.
+    op.add_column(
+        "users",
+        sa.Column(
+            "data_version",
+            sa.Integer(),
+            nullable=False,
+            server_default="0",
+            comment="Версия данных пользователя",
+        ),
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("users", "data_version")
@@ -2,7 +2,16 @@
 Модуль models содержит модели для работы с базой данных
 """
 
-from sqlalchemy import Column, String, ForeignKey, Text, DateTime
+from sqlalchemy import (
+    JSON,
+    Column,
+    Computed,
+    String,
+    ForeignKey,
+    Text,
+    DateTime,
+    Index,
+)
 from sqlalchemy.orm import Mapped, relationship
 from sqlalchemy.dialects import mysql
 from database import Base
@@ -79,14 +88,23 @@ class UserORM(Base, DefaultTable):
     login - Логин.
 
     password  - Пароль.
+
+    token_generation - Поколение токенов доступа. Увеличивается при отзыве токенов.
+
+    token_revoked_datetime - Дата и время последнего отзыва токенов доступа.
+
+    data_version - Версия данных пользователя. Увеличивается при изменении пользователя и его документов.
     """
 
     __tablename__ = "users"
-    __table_args__ = {
-        "mysql_engine": "InnoDB",
-        "comment": "Пользователи",
-        "mysql_auto_increment": "2",
-    }
+    __table_args__ = (
+        Index("ix_users_token_revoked_datetime", "token_revoked_datetime"),
+        {
+            "mysql_engine": "InnoDB",
+            "comment": "Пользователи",
+            "mysql_auto_increment": "2",
+        },
+    )
     last_name = Column(String(255), nullable=False, comment="Фамилия")
     first_name = Column(String(255), nullable=True, comment="Имя")
     patr_name = Column(String(255), nullable=True, comment="Отчество")
@@ -104,6 +122,23 @@ class UserORM(Base, DefaultTable):
     )
     login = Column(String(255), nullable=True, comment="Логин", unique=True)
     password = Column(Text, nullable=True, comment="Пароль")
+    token_generation = Column(
+        Integer,
+        nullable=False,
+        default=0,
+        server_default="0",
+        comment="Поколение токенов доступа",
+    )
+    token_revoked_datetime = Column(
+        DateTime, nullable=True, comment="Дата и время последнего отзыва токенов"
+    )
+    data_version = Column(
+        Integer,
+        nullable=False,
+        default=0,
+        server_default="0",
+        comment="Версия данных пользователя",
+    )
     documents: Mapped[list["DocumentsORM"]] = relationship(
         primaryjoin="UserORM.id==DocumentsORM.user_id"
     )
@@ -149,6 +184,8 @@ class DocumentTypesORM(Base, DefaultTable):
     наследуется от Base и DefaultTable
 
     name - Наименование типа документа.
+
+    required_fields - Обязательные поля документа.
     """
 
     __tablename__ = "document_types"
@@ -160,6 +197,7 @@ class DocumentTypesORM(Base, DefaultTable):
     name = Column(
         String(255), nullable=True, comment="Наименование типа документа", unique=True
     )
+    required_fields = Column(JSON, nullable=True, comment="Обязательные поля документа")
 
 
 class DocumentsORM(Base, DefaultTable):
@@ -175,10 +213,16 @@ class DocumentsORM(Base, DefaultTable):
     """
 
     __tablename__ = "documents"
-    __table_args__ = {
-        "mysql_engine": "InnoDB",
-        "comment": "Документы пользователей",
-    }
+    __table_args__ = (
+        Index("ix_documents_number", "number"),
+        Index("ix_documents_series", "series"),
+        Index("ix_documents_sender_name", "sender_name"),
+        Index("ix_documents_user_id_deleted", "user_id", "deleted"),
+        {
+            "mysql_engine": "InnoDB",
+            "comment": "Документы пользователей",
+        },
+    )
     user_id = Column(
         Integer,
         ForeignKey("users.id", ondelete="CASCADE"),
@@ -191,7 +235,31 @@ class DocumentsORM(Base, DefaultTable):
         nullable=True,
         comment="id типа документа",
     )
-    data = Column(Text, nullable=True, comment="Данные документов в формате JSON")
+    data = Column(JSON, nullable=True, comment="Данные документов в формате JSON")
+    number = Column(
+        String(255),
+        Computed(
+            "nullif(json_unquote(json_extract(`data`,'$.number')),'null')",
+            persisted=False,
+        ),
+        comment="Номер документа",
+    )
+    series = Column(
+        String(255),
+        Computed(
+            "nullif(json_unquote(json_extract(`data`,'$.series')),'null')",
+            persisted=False,
+        ),
+        comment="Серия документа",
+    )
+    sender_name = Column(
+        String(255),
+        Computed(
+            "nullif(json_unquote(json_extract(`data`,'$.senderName')),'null')",
+            persisted=False,
+        ),
+        comment="Наименование организации отправителя",
+    )
 
 
 class OrganizationORM(Base, DefaultTable):
@@ -213,3 +281,101 @@ class OrganizationORM(Base, DefaultTable):
     name = Column(
         String(255), nullable=False, comment="Наименование организации", unique=True
     )
+
+
+class ProcessedPackageORM(Base):
+    """
+    Класс ProcessedPackageORM. Представляет собой таблицу записанных посылок.
+    Для каждого отправителя посылки (блока Data) добавляется отдельная запись
+    в той же транзакции, что и его данные.
+
+    referral_guid - ГУИД посылки.
+
+    data_index - Номер отправителя в посылке.
+
+    package_id - id посылки.
+
+    payload_hash - SHA-256 содержимого посылки.
+
+    request_token - Токен запроса, записавшего посылку.
+
+    outcomes - Результаты записи пользователей в режиме partial.
+
+    create_user_id - Автор создания записи.
+
+    create_datetime - Дата и время создания записи.
+    """
+
+    __tablename__ = "processed_packages"
+    __table_args__ = {
+        "mysql_engine": "InnoDB",
+        "comment": "Записанные посылки",
+    }
+    referral_guid = Column(String(25), primary_key=True, comment="ГУИД посылки")
+    data_index = Column(
+        Integer,
+        primary_key=True,
+        server_default="0",
+        comment="Номер отправителя в посылке",
+    )
+    package_id = Column(mysql.BIGINT(20), nullable=False, comment="id посылки")
+    payload_hash = Column(
+        String(64), nullable=False, comment="SHA-256 содержимого посылки"
+    )
+    request_token = Column(
+        String(32), nullable=False, comment="Токен запроса, записавшего посылку"
+    )
+    outcomes = Column(
+        JSON, nullable=True, comment="Результаты записи пользователей в режиме partial"
+    )
+    create_user_id = Column(
+        Integer,
+        ForeignKey("users.id", ondelete="SET NULL"),
+        nullable=True,
+        comment="Автор создания записи",
+    )
+    create_datetime = Column(
+        DateTime, nullable=True, comment="Дата и время создания записи"
+    )
+
+
+class ChangeORM(Base):
+    """
+    Класс ChangeORM. Представляет собой таблицу изменений пользователей и документов (outbox).
+    Запись добавляется в той же транзакции, что и изменение.
+
+    id - id записи, выдается при добавлении.
+
+    seq - Порядковый номер изменения, присваивается после фиксации транзакции в порядке фиксации.
+
+    entity - Тип измененной записи: user или document.
+
+    entity_id - id измененной записи.
+
+    user_id - id пользователя, к которому относится запись.
+
+    action - Действие: create, update или delete.
+
+    create_datetime - Дата и время изменения.
+    """
+
+    __tablename__ = "changes"
+    __table_args__ = (
+        Index("ix_changes_seq", "seq", unique=True),
+        {
+            "mysql_engine": "InnoDB",
+            "comment": "Изменения пользователей и документов",
+        },
+    )
+    id = Column(
+        mysql.BIGINT(20),
+        primary_key=True,
+        autoincrement=True,
+        comment="id записи",
+    )
+    seq = Column(mysql.BIGINT(20), nullable=True, comment="Порядковый номер изменения")
+    entity = Column(String(16), nullable=False, comment="Тип измененной записи")
+    entity_id = Column(Integer, nullable=False, comment="id измененной записи")
+    user_id = Column(Integer, nullable=True, comment="id пользователя")
+    action = Column(String(16), nullable=False, comment="Действие")
+    create_datetime = Column(DateTime, nullable=False, comment="Дата и время изменения")
@@ -0,0 +1,135 @@
+"""
+Модуль passwords содержит хэширование и проверку паролей.
+
+Пароли хранятся в виде pbkdf2_sha256$<число итераций>$<соль>$<хэш>.
+Хэширование выполняется в пулах потоков ограниченного размера, чтобы не блокировать
+цикл событий. Пароли посылок хэшируются в отдельном пуле (PASSWORD_HASH_WORKERS),
+поэтому запись посылок не задерживает проверку паролей при входе (PASSWORD_VERIFY_WORKERS). Успешные проверки запоминаются на PASSWORD_CACHE_TTL секунд,
+поэтому серия запросов с одними учетными данными хэширует пароль один раз.
+Пароли в старом формате (base64) проверяются без хэширования и заменяются
+при следующем успешном входе.
+"""
+
+import asyncio
+import base64
+import hashlib
+import hmac
+import secrets
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+from common import BoundedCache, check_password
+from config import settings
+
+# Префикс паролей в текущем формате
+PREFIX = "pbkdf2_sha256"
+
+# Пул потоков проверки паролей и хэширования паролей из запросов
+_executor = ThreadPoolExecutor(
+    max_workers=settings.PASSWORD_VERIFY_WORKERS, thread_name_prefix="password"
+)
+
+# Пул потоков хэширования паролей из посылок
+_bulk_executor = ThreadPoolExecutor(
+    max_workers=settings.PASSWORD_HASH_WORKERS, thread_name_prefix="password-bulk"
+)
+
+# Успешные проверки: ключ -> время окончания действия
+_verified = BoundedCache(settings.PASSWORD_CACHE_SIZE)
+
+# Ключ кэша проверок. Пароли в кэше не хранятся.
+_cache_secret = secrets.token_bytes(32)
+
+
+def _pbkdf2(password: str, salt: bytes, iterations: int):
+    return hashlib.pbkdf2_hmac("sha256", password.encode(), salt, iterations)
+
+
+def _hash(password: str):
+    salt = secrets.token_bytes(16)
+    iterations = settings.PASSWORD_HASH_ITERATIONS
+    digest = _pbkdf2(password, salt, iterations)
+    return "$".join(
+        (
+            PREFIX,
+            str(iterations),
+            base64.b64encode(salt).decode(),
+            base64.b64encode(digest).decode(),
+        )
+    )
+
+
+def _verify(stored_password: str, password: str):
+    try:
+        _, iterations, salt, digest = stored_password.split("$")
+        salt = base64.b64decode(salt)
+        digest = base64.b64decode(digest)
+        iterations = int(iterations)
+    except ValueError:
+        return False
+    return hmac.compare_digest(_pbkdf2(password, salt, iterations), digest)
+
+
+def is_legacy(stored_password: str | bytes | None):
+    """
+    Функция проверки, что пароль хранится в старом формате (base64).
+    :return bool
+    """
+    if isinstance(stored_password, bytes):
+        stored_password = stored_password.decode()
+    return stored_password is not None and not stored_password.startswith(f"{PREFIX}$")
+
+
+async def hash_password(password: str):
+    """
+    Функция хэширования пароля в пуле потоков.
+    :param password: пароль.
+    :return str
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, _hash, password)
+
+
+async def hash_passwords(passwords: List[str]):
+    """
+    Функция хэширования списка паролей. Пароли хэшируются параллельно
+    всеми потоками пула хэширования посылок.
+    :param passwords: список паролей.
+    :return list[str]
+    """
+    loop = asyncio.get_running_loop()
+    return await asyncio.gather(
+        *(
+            loop.run_in_executor(_bulk_executor, _hash, password)
+            for password in passwords
+        )
+    )
+
+
+async def verify_password(stored_password: Optional[str | bytes], password: str):
+    """
+    Функция проверки пароля. Пароль в текущем формате проверяется в пуле потоков,
+    успешная проверка запоминается на PASSWORD_CACHE_TTL секунд.
+    :param stored_password: пароль из базы данных.
+    :param password: переданный пароль.
+    :return bool
+    """
+    if stored_password is None:
+        return False
+    if isinstance(stored_password, bytes):
+        stored_password = stored_password.decode()
+    if is_legacy(stored_password):
+        return check_password(stored_password, password)
+    key = hmac.new(
+        _cache_secret,
+        f"{stored_password}\0{password}".encode(),
+        hashlib.sha256,
+    ).digest()
+    expires = _verified.get(key)
+    if expires is not None and expires > time.monotonic():
+        return True
+    loop = asyncio.get_running_loop()
+    if not await loop.run_in_executor(_executor, _verify, stored_password, password):
+        return False
+    _verified.set(key, time.monotonic() + settings.PASSWORD_CACHE_TTL)
+    return True
@@ -2,18 +2,36 @@
 Модуль queries содержит запросы к базе данных.
 """
 
-from sqlalchemy import select, update
+from pydantic import ValidationError
+from sqlalchemy import and_, func, insert, literal, select, update
 from sqlalchemy.orm import selectinload
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
-import base64
+import asyncio
 import datetime
 import json
+import logging
+from typing import List
+from config import settings
 from exceptions import *
-from common import create_user_show, validate_document, DocumentsID
+from changes import mark_changed
+from database import session_factory
+from metrics import count_ingested
+from passwords import hash_password, is_legacy, verify_password
+from tokens import revocations
+from common import (
+    BoundedCache,
+    create_user_show,
+    validate_document,
+    DocumentsID,
+)
 from models import (
     UserORM,
     DocumentsORM,
     OrganizationORM,
+    ProcessedPackageORM,
+    ChangeORM,
 )
 from schemas import (
     Document,
@@ -24,8 +42,15 @@ from schemas import (
     UserUpdate,
 )
 
+logger = logging.getLogger()
+
+# Сообщение клиенту о нарушении ограничений базы. Текст ошибки драйвера только записывается в лог.
+INTEGRITY_ERROR_MESSAGE = (
+    "Данные конфликтуют с записанными ранее: повторяющийся id или логин."
+)
 
-async def create_documents(
+
+def build_document_row(
     document: Document,
     user_id: int,
     creator_id: int,
@@ -33,19 +58,17 @@ async def create_documents(
     referralId: int,
     referralDate: datetime.datetime,
     create_datetime: datetime.datetime,
-    session: AsyncSession,
 ):
     """
-    Функция создания документа в базе данных.
+    Функция подготовки строки таблицы documents. Проверяет документ и формирует его данные.
+    :param document: объект класса Document.
     :param user_id: id пользователя.
     :param creator_id: id пользователя создателя записи.
     :param senderName: имя организации, от которой пришел запрос.
     :param referralId: id посылки.
     :param referralDate: дата и время отправления посылки.
     :param create_datetime: дата и время создания записи.
-    :param creator_id: id пользователя создателя записи.
-    :param session: сессия работы с базой данных.
-
+    :return dict: значения колонок таблицы documents.
     """
     validate_document(document, document.documentType_id)
     document_data = document.model_dump()
@@ -54,20 +77,17 @@ async def create_documents(
     document_data["referralId"] = referralId
     document_data["referralDate"] = referralDate
     document_data["senderName"] = senderName
-    document_data_json = DocumentData.model_validate(document_data).model_dump_json()
-    document_orm = DocumentsORM(
+    return dict(
         id=document.id,
         create_datetime=create_datetime,
         create_user_id=creator_id,
         user_id=user_id,
         type_id=document.documentType_id,
-        data=document_data_json,
+        data=DocumentData.model_validate(document_data).model_dump(mode="json"),
     )
-    session.add(document_orm)
-    await session.flush()
 
 
-async def create_documents_with_number_only(
+def build_number_document_row(
     user_id: int,
     creator_id: int,
     type_id: int,
@@ -76,10 +96,9 @@ async def create_documents_with_number_only(
     referralId: int,
     referralDate: datetime.datetime,
     create_datetime: datetime.datetime,
-    session: AsyncSession,
 ):
     """
-    Функция создания документа типа СНИЛС и ИНН.
+    Функция подготовки строки таблицы documents для документа типа СНИЛС и ИНН.
     :param user_id: id пользователя.
     :param creator_id: id пользователя создателя записи.
     :param type_id: id типа документа.
@@ -88,47 +107,44 @@ async def create_documents_with_number_only(
     :param referralId: id посылки.
     :param referralDate: дата и время отправления посылки.
     :param create_datetime: дата и время создания записи.
-    :param session: сессия работы с базой данных.
-
+    :return dict: значения колонок таблицы documents.
     """
-    document = DocumentsORM(
+    return dict(
+        id=None,
         type_id=type_id,
         create_user_id=creator_id,
         user_id=user_id,
         create_datetime=create_datetime,
-        data=json.dumps(
-            {
-                "number": number,
-                "senderName": senderName,
-                "referralId": referralId,
-                "referralDate": str(referralDate),
-            }
-        ),
+        data={
+            "number": number,
+            "senderName": senderName,
+            "referralId": referralId,
+            "referralDate": str(referralDate),
+        },
     )
-    session.add(document)
-    await session.flush()
 
 
-async def create_user(
+def build_user_rows(
     user: User,
     creator_id: int,
     senderName: str,
     referralId: int,
     referralDate: datetime.datetime,
-    session: AsyncSession,
+    create_datetime: datetime.datetime,
+    password_hash: str = None,
 ):
     """
-    Функция создания пользователя.
+    Функция подготовки строк пользователя и всех его документов, включая СНИЛС и ИНН.
     :param user: объект класса User.
     :param creator_id: id пользователя создателя записи.
     :param senderName: имя организации, от которой пришел запрос.
     :param referralId: id посылки.
     :param referralDate: дата и время отправления посылки.
-    :param session: сессия работы с базой данных.
-
+    :param create_datetime: дата и время создания записи.
+    :param password_hash: хэш пароля пользователя.
+    :return (dict, list[dict]): строка таблицы users и строки таблицы documents.
     """
-    create_datetime = datetime.datetime.now()
-    user_orm = UserORM(
+    user_row = dict(
         id=user.id,
         last_name=user.lastName,
         first_name=user.firstName,
@@ -136,76 +152,576 @@ async def create_user(
         gender_id=user.sex,
         type_id=2,
         login=user.Credentials.username,
-        password=base64.b64encode(user.Credentials.password.encode()),
+        password=password_hash,
         create_datetime=create_datetime,
         create_user_id=creator_id,
     )
-    session.add(user_orm)
-    await session.flush()
-    await session.refresh(user_orm)
-
-    for document in user.Documents:
-        await create_documents(
-            document,
-            user_orm.id,
-            creator_id,
-            senderName,
-            referralId,
-            referralDate,
-            create_datetime,
-            session,
+    document_rows = []
+    for document in user.Documents or []:
+        document_rows.append(
+            build_document_row(
+                document,
+                user.id,
+                creator_id,
+                senderName,
+                referralId,
+                referralDate,
+                create_datetime,
+            )
         )
-    if user.snils is not None:
-        await create_documents_with_number_only(
-            user_orm.id,
-            creator_id,
-            DocumentsID.SNILS_ID,
-            user.snils,
-            senderName,
-            referralId,
-            referralDate,
-            create_datetime,
-            session,
+    for type_id, number in (
+        (DocumentsID.SNILS_ID, user.snils),
+        (DocumentsID.INN_ID, user.inn),
+    ):
+        if number is not None:
+            document_rows.append(
+                build_number_document_row(
+                    user.id,
+                    creator_id,
+                    type_id,
+                    number,
+                    senderName,
+                    referralId,
+                    referralDate,
+                    create_datetime,
+                )
+            )
+    return user_row, document_rows
+
+
+async def insert_rows(table, rows: list, session: AsyncSession):
+    """
+    Функция записи строк многострочными INSERT, не более settings.INSERT_CHUNK_SIZE строк в запросе.
+    :param table: модель таблицы.
+    :param rows: список словарей со значениями колонок.
+    :param session: сессия работы с базой данных.
+    """
+    chunk_size = settings.INSERT_CHUNK_SIZE
+    for start in range(0, len(rows), chunk_size):
+        await session.execute(insert(table).values(rows[start : start + chunk_size]))
+
+
+async def record_changes(
+    entity: str, action: str, records: List[tuple], session: AsyncSession
+):
+    """
+    Функция добавления записей в таблицу изменений в текущей транзакции.
+    Порядковый номер записям присваивается после фиксации транзакции.
+    При изменении документов и изменении пользователя увеличивается версия данных
+    затронутых пользователей, по которой вычисляется ETag.
+    :param entity: тип измененной записи: user или document.
+    :param action: действие: create, update или delete.
+    :param records: список пар (id записи, id пользователя).
+    :param session: сессия работы с базой данных.
+    """
+    if not records:
+        return
+    create_datetime = datetime.datetime.now()
+    await insert_rows(
+        ChangeORM,
+        [
+            dict(
+                entity=entity,
+                entity_id=entity_id,
+                user_id=user_id,
+                action=action,
+                create_datetime=create_datetime,
+            )
+            for entity_id, user_id in records
+        ],
+        session,
+    )
+    if entity == "document" or action == "update":
+        await bump_data_version([user_id for _, user_id in records], session)
+    mark_changed(session)
+
+
+async def record_user_document_changes(
+    action: str, user_ids: List[int], session: AsyncSession
+):
+    """
+    Функция добавления записей изменений для всех неудаленных документов пользователей
+    одним INSERT ... SELECT в текущей транзакции. Используется, когда документы записываются
+    или удаляются вместе с пользователем и их id не известны заранее.
+    :param action: действие: create или delete.
+    :param user_ids: список id пользователей.
+    :param session: сессия работы с базой данных.
+    """
+    if not user_ids:
+        return
+    await session.execute(
+        insert(ChangeORM).from_select(
+            ["entity", "entity_id", "user_id", "action", "create_datetime"],
+            select(
+                literal("document"),
+                DocumentsORM.id,
+                DocumentsORM.user_id,
+                literal(action),
+                literal(datetime.datetime.now()),
+            )
+            .where(DocumentsORM.user_id.in_(user_ids), DocumentsORM.deleted == 0)
+            .order_by(DocumentsORM.id),
         )
-    if user.inn is not None:
-        await create_documents_with_number_only(
-            user_orm.id,
+    )
+    mark_changed(session)
+
+
+async def bump_data_version(user_ids: List[int], session: AsyncSession):
+    """
+    Функция увеличения версии данных пользователей в текущей транзакции.
+    :param user_ids: список id пользователей.
+    :param session: сессия работы с базой данных.
+    """
+    await session.execute(
+        update(UserORM)
+        .where(UserORM.id.in_(sorted(set(user_ids))))
+        .values(data_version=UserORM.data_version + 1)
+    )
+
+
+async def get_changes(after: int, limit: int, session: AsyncSession):
+    """
+    Функция получения изменений с порядковым номером больше after.
+    Номера присваиваются после фиксации транзакций в порядке фиксации (модуль changes),
+    поэтому изменения с меньшими номерами уже видны, и лента не пропускает изменения.
+    Записи, которым номер еще не присвоен, не возвращаются.
+    :param after: последний полученный порядковый номер.
+    :param limit: максимальное число изменений.
+    :param session: сессия работы с базой данных.
+    :return list[dict]
+    """
+    result = await session.execute(
+        select(ChangeORM)
+        .where(ChangeORM.seq > after)
+        .order_by(ChangeORM.seq)
+        .limit(limit)
+    )
+    return [
+        {
+            "seq": change.seq,
+            "entity": change.entity,
+            "entity_id": change.entity_id,
+            "user_id": change.user_id,
+            "action": change.action,
+            "datetime": change.create_datetime.isoformat(),
+        }
+        for change in result.scalars()
+    ]
+
+
+async def record_creations(user_rows: List[dict], session: AsyncSession):
+    """
+    Функция добавления записей изменений о создании пользователей и всех их документов.
+    Изменения документов добавляются запросом INSERT ... SELECT на каждые
+    settings.INSERT_CHUNK_SIZE пользователей.
+    :param user_rows: записанные строки таблицы users.
+    :param session: сессия работы с базой данных.
+    """
+    user_ids = [row["id"] for row in user_rows]
+    await record_changes(
+        "user", "create", [(user_id, user_id) for user_id in user_ids], session
+    )
+    chunk_size = settings.INSERT_CHUNK_SIZE
+    for start in range(0, len(user_ids), chunk_size):
+        await record_user_document_changes(
+            "create", user_ids[start : start + chunk_size], session
+        )
+
+
+async def create_users_bulk(
+    users: List[User],
+    password_hashes: List[str],
+    creator_id: int,
+    senderName: str,
+    referralId: int,
+    referralDate: datetime.datetime,
+    session: AsyncSession,
+):
+    """
+    Функция пакетного создания пользователей и их документов.
+    Все строки формируются и проверяются в памяти, затем записываются
+    несколькими многострочными INSERT: сначала пользователи, затем документы.
+    Пароли хэшируются вызывающим кодом до начала транзакции, чтобы хэширование
+    не удлиняло транзакцию.
+    :param users: список объектов класса User.
+    :param password_hashes: хэши паролей пользователей в том же порядке.
+    :param creator_id: id пользователя создателя записи.
+    :param senderName: имя организации, от которой пришел запрос.
+    :param referralId: id посылки.
+    :param referralDate: дата и время отправления посылки.
+    :param session: сессия работы с базой данных.
+    :return int: число записанных строк.
+    """
+    create_datetime = datetime.datetime.now()
+    user_rows = []
+    document_rows = []
+    for user, password_hash in zip(users, password_hashes):
+        user_row, user_document_rows = build_user_rows(
+            user,
             creator_id,
-            DocumentsID.INN_ID,
-            user.inn,
             senderName,
             referralId,
             referralDate,
             create_datetime,
+            password_hash,
+        )
+        user_rows.append(user_row)
+        document_rows.extend(user_document_rows)
+    await insert_rows(UserORM, user_rows, session)
+    await insert_rows(DocumentsORM, document_rows, session)
+    await record_creations(user_rows, session)
+    count_ingested(session, len(user_rows), len(document_rows))
+    return len(user_rows) + len(document_rows)
+
+
+async def insert_user_rows(
+    user_rows: List[dict], document_rows: List[dict], session: AsyncSession
+):
+    """
+    Функция записи строк пользователей и документов внутри точки сохранения (SAVEPOINT).
+    При ошибке целостности откатывается только точка сохранения, исключение пробрасывается дальше.
+    :param user_rows: строки таблицы users.
+    :param document_rows: строки таблицы documents.
+    :param session: сессия работы с базой данных.
+    """
+    async with session.begin_nested():
+        await insert_rows(UserORM, user_rows, session)
+        await insert_rows(DocumentsORM, document_rows, session)
+        await record_creations(user_rows, session)
+    count_ingested(session, len(user_rows), len(document_rows))
+
+
+async def create_users_partial(
+    users: List[User],
+    password_hashes: List[str],
+    creator_id: int,
+    senderName: str,
+    referralId: int,
+    referralDate: datetime.datetime,
+    session: AsyncSession,
+):
+    """
+    Функция создания пользователей с пропуском ошибочных.
+    Пользователи с неверными документами отбрасываются при проверке в памяти.
+    Остальные сначала записываются многострочными INSERT внутри одной точки сохранения.
+    Если запись нарушает ограничения базы (например, повторяющийся логин или id),
+    точка сохранения откатывается и каждый пользователь записывается внутри своей точки сохранения,
+    так что в базе остаются все пользователи, кроме ошибочных.
+    :param users: список объектов класса User.
+    :param password_hashes: хэши паролей пользователей в том же порядке.
+    :param creator_id: id пользователя создателя записи.
+    :param senderName: имя организации, от которой пришел запрос.
+    :param referralId: id посылки.
+    :param referralDate: дата и время отправления посылки.
+    :param session: сессия работы с базой данных.
+    :return (int, list[dict]): число записанных строк и результаты по пользователям
+    (id, status - created или failed, detail - причина ошибки).
+    """
+    create_datetime = datetime.datetime.now()
+    outcomes = []
+    prepared = []
+    for user, password_hash in zip(users, password_hashes):
+        outcome = {"id": user.id, "status": "created"}
+        outcomes.append(outcome)
+        try:
+            user_row, document_rows = build_user_rows(
+                user,
+                creator_id,
+                senderName,
+                referralId,
+                referralDate,
+                create_datetime,
+                password_hash,
+            )
+        except BadValidation as exc:
+            outcome.update(status="failed", detail=exc.message)
+            continue
+        prepared.append((outcome, user_row, document_rows))
+    if not prepared:
+        return 0, outcomes
+    try:
+        await insert_user_rows(
+            [user_row for _, user_row, _ in prepared],
+            [row for _, _, document_rows in prepared for row in document_rows],
             session,
         )
+    except IntegrityError:
+        for outcome, user_row, document_rows in prepared:
+            try:
+                await insert_user_rows([user_row], document_rows, session)
+            except IntegrityError as exc:
+                logger.error(f"User {outcome['id']}. {exc}")
+                outcome.update(status="failed", detail=INTEGRITY_ERROR_MESSAGE)
+    rows = sum(
+        1 + len(document_rows)
+        for outcome, _, document_rows in prepared
+        if outcome["status"] == "created"
+    )
+    return rows, outcomes
+
+
+# Кэш соответствий oid -> id организаций в памяти процесса
+organization_cache = BoundedCache(settings.ORGANIZATION_CACHE_SIZE)
 
 
-async def create_organization(
-    organization: OrganizationSchema, creator_id: int, session: AsyncSession
+async def resolve_organizations(
+    organizations: List[OrganizationSchema], creator_id: int, session: AsyncSession
 ):
     """
-    Функция создания организации.
-    :param organization: объект класса OrganizationSchema.
+    Функция получения id организаций по oid. Отсутствующие организации создаются.
+    Известные организации берутся из кэша процесса, остальные ищутся одним запросом IN (...).
+    Новые организации добавляются атомарным INSERT ... ON DUPLICATE KEY UPDATE,
+    поэтому параллельные запросы от одного нового отправителя не приводят к IntegrityError.
+    В кэш попадают только организации, найденные до вставки, то есть уже зафиксированные в базе.
+    :param organizations: список объектов класса OrganizationSchema.
     :param creator_id: id пользователя создателя записи.
     :param session: сессия работы с базой данных.
+    :return dict: соответствие oid -> id организации.
+    """
+    organization_ids = {}
+    missing = {}
+    for organization in organizations:
+        if organization.oid in organization_ids or organization.oid in missing:
+            continue
+        organization_id = organization_cache.get(organization.oid)
+        if organization_id is None:
+            missing[organization.oid] = organization
+        else:
+            organization_ids[organization.oid] = organization_id
+    if not missing:
+        return organization_ids
 
+    query = select(OrganizationORM.oid, OrganizationORM.id).where(
+        OrganizationORM.oid.in_(list(missing))
+    )
+    result = await session.execute(query)
+    for oid, organization_id in result:
+        organization_ids[oid] = organization_id
+        organization_cache.set(oid, organization_id)
+        missing.pop(oid)
+    if not missing:
+        return organization_ids
+
+    create_datetime = datetime.datetime.now()
+    insert_query = mysql_insert(OrganizationORM).values(
+        [
+            dict(
+                name=missing[oid].fullName,
+                oid=oid,
+                create_user_id=creator_id,
+                create_datetime=create_datetime,
+            )
+            for oid in sorted(missing)
+        ]
+    )
+    insert_query = insert_query.on_duplicate_key_update(id=OrganizationORM.id)
+    await session.execute(insert_query)
+    # Блокирующее чтение видит строки, зафиксированные параллельными запросами
+    query = (
+        select(OrganizationORM.oid, OrganizationORM.id)
+        .where(OrganizationORM.oid.in_(list(missing)))
+        .with_for_update(read=True)
+    )
+    result = await session.execute(query)
+    for oid, organization_id in result:
+        organization_ids[oid] = organization_id
+        missing.pop(oid)
+    if missing:
+        oid, organization = next(iter(missing.items()))
+        raise BadValidation(
+            f"Невозможно добавить организацию {oid}. Наименование {organization.fullName} уже занято."
+        )
+    return organization_ids
+
+
+async def get_processed_packages(referral_guids: List[str], session: AsyncSession):
     """
-    query = select(OrganizationORM).where(OrganizationORM.oid == organization.oid)
+    Функция получения уже записанных блоков посылок одним запросом IN (...).
+    :param referral_guids: список ГУИД посылок.
+    :param session: сессия работы с базой данных.
+    :return dict: соответствие (ГУИД посылки, номер отправителя) ->
+    (SHA-256 содержимого посылки, результаты записи пользователей в режиме partial).
+    """
+    if not referral_guids:
+        return {}
+    query = select(
+        ProcessedPackageORM.referral_guid,
+        ProcessedPackageORM.data_index,
+        ProcessedPackageORM.payload_hash,
+        ProcessedPackageORM.outcomes,
+    ).where(ProcessedPackageORM.referral_guid.in_(referral_guids))
     result = await session.execute(query)
-    organization_in_db = result.scalar_one_or_none()
-    if organization_in_db:
-        return None
-    else:
-        create_datetime = datetime.datetime.now()
-        organization_orm = OrganizationORM(
-            name=organization.fullName,
-            oid=organization.oid,
-            create_user_id=creator_id,
-            create_datetime=create_datetime,
+    return {
+        (referral_guid, data_index): (payload_hash, outcomes)
+        for referral_guid, data_index, payload_hash, outcomes in result
+    }
+
+
+async def get_written_user_ids(users: List[User], session: AsyncSession):
+    """
+    Функция получения id пользователей, которые уже записаны с теми же id и логином.
+    Для каждой части списка выполняется один запрос SELECT ... WHERE id IN (...).
+    :param users: список объектов класса User.
+    :param session: сессия работы с базой данных.
+    :return set[int]
+    """
+    logins = {user.id: user.Credentials.username for user in users}
+    written = set()
+    for chunk in chunked(list(logins)):
+        result = await session.execute(
+            select(UserORM.id, UserORM.login).where(UserORM.id.in_(chunk))
+        )
+        written.update(
+            user_id for user_id, login in result.tuples() if logins[user_id] == login
         )
-        session.add(organization_orm)
-        await session.flush()
+    return written
+
+
+async def claim_package_blocks(
+    blocks: List[dict],
+    request_token: str,
+    creator_id: int,
+    session: AsyncSession,
+):
+    """
+    Функция добавления отметок о записи блоков посылок (данных одного отправителя) в текущей транзакции.
+    Отметки добавляются одним INSERT ... ON DUPLICATE KEY UPDATE в порядке первичного ключа,
+    поэтому параллельные запросы блокируют строки в одном порядке.
+    Если тот же блок в этот момент записывает другой запрос, INSERT ожидает завершения
+    его транзакции: после фиксации блок считается записанным, после отката отметка
+    добавляется текущим запросом.
+    :param blocks: список словарей с ключами referral_guid, data_index, package_id, payload_hash.
+    :param request_token: токен текущего запроса.
+    :param creator_id: id пользователя создателя записи.
+    :param session: сессия работы с базой данных.
+    :return (set, dict): ключи (ГУИД посылки, номер отправителя) блоков, которые записывает
+    текущий запрос, и результаты записи пользователей блоков, записанных другими запросами.
+    """
+    if not blocks:
+        return set(), {}
+    blocks = sorted(
+        blocks, key=lambda block: (block["referral_guid"], block["data_index"])
+    )
+    create_datetime = datetime.datetime.now()
+    insert_query = mysql_insert(ProcessedPackageORM).values(
+        [
+            dict(
+                block,
+                request_token=request_token,
+                create_user_id=creator_id,
+                create_datetime=create_datetime,
+            )
+            for block in blocks
+        ]
+    )
+    insert_query = insert_query.on_duplicate_key_update(
+        referral_guid=ProcessedPackageORM.referral_guid
+    )
+    await session.execute(insert_query)
+    # Блокирующее чтение видит строки, зафиксированные параллельными запросами
+    query = (
+        select(
+            ProcessedPackageORM.referral_guid,
+            ProcessedPackageORM.data_index,
+            ProcessedPackageORM.payload_hash,
+            ProcessedPackageORM.request_token,
+            ProcessedPackageORM.outcomes,
+        )
+        .where(
+            ProcessedPackageORM.referral_guid.in_(
+                {block["referral_guid"] for block in blocks}
+            )
+        )
+        .with_for_update(read=True)
+    )
+    expected = {
+        (block["referral_guid"], block["data_index"]): block["payload_hash"]
+        for block in blocks
+    }
+    claimed = set()
+    written = {}
+    for row in await session.execute(query):
+        key = (row.referral_guid, row.data_index)
+        if key not in expected:
+            continue
+        if row.payload_hash != expected[key]:
+            raise PackageConflict(
+                f"Посылка {row.referral_guid} уже записана с другим содержимым."
+            )
+        if row.request_token == request_token:
+            claimed.add(key)
+        else:
+            written[key] = row.outcomes
+    return claimed, written
+
+
+async def save_block_outcomes(
+    referral_guid: str, data_index: int, outcomes: List[dict], session: AsyncSession
+):
+    """
+    Функция сохранения результатов записи пользователей блока в отметке о записи блока.
+    Выполняется в транзакции записи блока.
+    :param referral_guid: ГУИД посылки.
+    :param data_index: номер отправителя в посылке.
+    :param outcomes: результаты записи пользователей.
+    :param session: сессия работы с базой данных.
+    """
+    await session.execute(
+        update(ProcessedPackageORM)
+        .where(
+            ProcessedPackageORM.referral_guid == referral_guid,
+            ProcessedPackageORM.data_index == data_index,
+        )
+        .values(outcomes=outcomes)
+    )
+
+
+# Задачи замены паролей в старом формате
+_password_upgrades = set()
+
+
+async def upgrade_password(user_id: int, stored_password: str, password: str):
+    """
+    Функция замены пароля в старом формате (base64) на хэш PBKDF2.
+    Выполняется на основной базе в отдельной сессии. Пароль заменяется,
+    только если он не изменился после проверки.
+    :param user_id: id пользователя.
+    :param stored_password: пароль из базы данных в старом формате.
+    :param password: проверенный пароль.
+    """
+    password_hash = await hash_password(password)
+    async with session_factory() as session:
+        await session.execute(
+            update(UserORM)
+            .where(UserORM.id == user_id, UserORM.password == stored_password)
+            .values(password=password_hash)
+        )
+        await session.commit()
+
+
+async def check_user_password(user_id: int, stored_password: str, password: str):
+    """
+    Функция проверки пароля пользователя.
+    После успешной проверки пароль в старом формате заменяется хэшем в фоновой задаче,
+    чтобы не задерживать ответ.
+    :param user_id: id пользователя.
+    :param stored_password: пароль из базы данных.
+    :param password: переданный пароль.
+    :return bool
+    """
+    if not await verify_password(stored_password, password):
+        return False
+    if is_legacy(stored_password):
+        task = asyncio.create_task(upgrade_password(user_id, stored_password, password))
+        _password_upgrades.add(task)
+        task.add_done_callback(_password_upgraded)
+    return True
+
+
+def _password_upgraded(task: asyncio.Task):
+    _password_upgrades.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logger.error(f"Password upgrade failed. {task.exception()}")
 
 
 async def get_user_auth_by_login_and_password(
@@ -213,69 +729,119 @@ async def get_user_auth_by_login_and_password(
 ):
     """
     Функция для получения данных в виде UserAuth(id пользователя и id типа пользователя).
+    Пользователь ищется по уникальному индексу логина, пароль проверяется на стороне приложения.
     :param login: логин.
     :param password: пароль.
     :param session: сессия работы с базой данных.
     :return UserAuth
 
     """
-    query = select(UserORM).where(
+    query = select(UserORM.id, UserORM.type_id, UserORM.password).where(
         UserORM.login == login,
-        UserORM.password == base64.b64encode(password.encode()),
         UserORM.deleted == 0,
     )
     result = await session.execute(query)
-    user = result.scalar_one_or_none()
-    if user:
+    user = result.one_or_none()
+    if user and await check_user_password(user.id, user.password, password):
         return UserAuth(id=user.id, type_id=user.type_id)
     else:
         raise BadAuthorization
 
 
-async def get_user_info_by_login_and_password(
+async def get_token_user_by_login_and_password(
     login: str, password: str, session: AsyncSession
 ):
     """
-    Функция для получения полных данных пользователя, включая документы.
+    Функция для получения данных пользователя для выпуска токена доступа.
     :param login: логин.
     :param password: пароль.
     :param session: сессия работы с базой данных.
+    :return (UserAuth, int): пользователь и поколение его токенов.
+    """
+    query = select(
+        UserORM.id, UserORM.type_id, UserORM.password, UserORM.token_generation
+    ).where(
+        UserORM.login == login,
+        UserORM.deleted == 0,
+    )
+    result = await session.execute(query)
+    user = result.one_or_none()
+    if user and await check_user_password(user.id, user.password, password):
+        return UserAuth(id=user.id, type_id=user.type_id), user.token_generation
+    else:
+        raise BadAuthorization
+
+
+async def get_user_version_by_login_and_password(
+    login: str, password: str, session: AsyncSession
+):
+    """
+    Функция для получения тега версии данных пользователя (ETag) без загрузки документов.
+    Тег составляется из id пользователя и версии его данных, которая увеличивается
+    в транзакции каждого изменения пользователя и его документов,
+    поэтому запрос читает только строку пользователя по индексу логина.
+    :param login: логин.
+    :param password: пароль.
+    :param session: сессия работы с базой данных.
+    :return (int, str): id пользователя и тег версии.
+    """
+    query = select(UserORM.id, UserORM.password, UserORM.data_version).where(
+        UserORM.login == login,
+        UserORM.deleted == 0,
+    )
+    result = await session.execute(query)
+    user = result.one_or_none()
+    if user and await check_user_password(user.id, user.password, password):
+        return user.id, f'"{user.id}-{user.data_version}"'
+    else:
+        raise BadAuthorization
+
+
+async def get_user_info_by_id(user_id: int, session: AsyncSession):
+    """
+    Функция для получения полных данных пользователя по id, включая документы.
+    :param user_id: id пользователя.
+    :param session: сессия работы с базой данных.
     :return UserShow
     """
     query = (
         select(UserORM)
-        .where(
-            UserORM.login == login,
-            UserORM.password == base64.b64encode(password.encode()),
-            UserORM.deleted == 0,
-        )
+        .where(UserORM.id == user_id, UserORM.deleted == 0)
         .options(selectinload(UserORM.documents))
     )
-
     result = await session.execute(query)
     user = result.scalar_one_or_none()
-
     if user:
         return create_user_show(user)
     else:
         raise BadAuthorization
 
 
-async def get_users_info(session: AsyncSession, limit: int = 10, offset: int = 0):
+async def get_users_info(
+    session: AsyncSession, limit: int = 10, offset: int = 0, after_id: int = None
+):
     """
     Функция для получения списка всех пользователей включая документы.
+    Пользователи упорядочены по id. Если передан after_id, используется пагинация
+    по ключу (WHERE id > after_id), время выполнения которой не зависит от номера страницы,
+    а offset игнорируется.
     :param session: сессия работы с базой данных.
     :param limit: ограничение размера списка.
     :param offset: число пропущенных записей.
+    :param after_id: id последнего пользователя предыдущей страницы.
     :return List[UserShow]
     """
     query = (
         select(UserORM)
         .where(UserORM.deleted == 0)
+        .order_by(UserORM.id)
         .limit(limit)
-        .offset(offset)
         .options(selectinload(UserORM.documents))
     )
+    if after_id is not None:
+        query = query.where(UserORM.id > after_id)
+    else:
+        query = query.offset(offset)
 
     result = await session.execute(query)
     users = result.scalars().all()
@@ -286,6 +852,116 @@ async def get_users_info(session: AsyncSession, limit: int = 10, offset: int = 0
     return list_of_users
 
 
+async def get_users_info_aggregated(
+    session: AsyncSession,
+    limit: int = 10,
+    offset: int = 0,
+    after_id: int = None,
+    document_number: str = None,
+    document_series: str = None,
+    sender_name: str = None,
+):
+    """
+    Функция для получения списка всех пользователей включая документы одним запросом.
+    Неудаленные документы каждого пользователя собираются на стороне базы в массив
+    JSON_ARRAYAGG, поэтому ORM объекты не создаются, а данные документов разбираются
+    одним вызовом json.loads на пользователя.
+    Параметры пагинации аналогичны get_users_info.
+    Фильтры по данным документа используют индексы генерируемых колонок documents
+    и отбирают пользователей, у которых есть неудаленный документ со всеми указанными значениями.
+    :param session: сессия работы с базой данных.
+    :param limit: ограничение размера списка.
+    :param offset: число пропущенных записей.
+    :param after_id: id последнего пользователя предыдущей страницы.
+    :param document_number: номер документа.
+    :param document_series: серия документа.
+    :param sender_name: наименование организации отправителя документа.
+    :return List[dict]: данные пользователей в формате UserShow.
+    """
+    users_page = (
+        select(
+            UserORM.id,
+            UserORM.type_id,
+            UserORM.last_name,
+            UserORM.first_name,
+            UserORM.patr_name,
+            UserORM.gender_id,
+        )
+        .where(UserORM.deleted == 0)
+        .order_by(UserORM.id)
+        .limit(limit)
+    )
+    if after_id is not None:
+        users_page = users_page.where(UserORM.id > after_id)
+    else:
+        users_page = users_page.offset(offset)
+    document_filters = [
+        column == value
+        for column, value in (
+            (DocumentsORM.number, document_number),
+            (DocumentsORM.series, document_series),
+            (DocumentsORM.sender_name, sender_name),
+        )
+        if value is not None
+    ]
+    if document_filters:
+        users_page = users_page.where(
+            UserORM.id.in_(
+                select(DocumentsORM.user_id).where(
+                    DocumentsORM.deleted == 0, *document_filters
+                )
+            )
+        )
+    users_page = users_page.subquery("users_page")
+    documents = func.json_arrayagg(
+        func.json_object(
+            "id",
+            DocumentsORM.id,
+            "type_id",
+            DocumentsORM.type_id,
+            "data",
+            DocumentsORM.data,
+        )
+    )
+    query = (
+        select(users_page, documents.label("documents"))
+        .select_from(
+            users_page.outerjoin(
+                DocumentsORM,
+                and_(
+                    DocumentsORM.user_id == users_page.c.id,
+                    DocumentsORM.deleted == 0,
+                ),
+            )
+        )
+        .group_by(*users_page.c)
+        .order_by(users_page.c.id)
+    )
+
+    result = await session.execute(query)
+    list_of_users = []
+    for row in result:
+        # при отсутствии документов LEFT JOIN дает один объект со значениями null
+        list_of_documents = [
+            document
+            for document in json.loads(row.documents)
+            if document["id"] is not None
+        ]
+        list_of_documents.sort(key=lambda document: document["id"])
+        list_of_users.append(
+            {
+                "id": row.id,
+                "type_id": row.type_id,
+                "lastName": row.last_name,
+                "firstName": row.first_name,
+                "patrName": row.patr_name,
+                "gender_id": row.gender_id,
+                "documents": list_of_documents,
+            }
+        )
+    return list_of_users
+
+
 async def delete_user_info_from_db(user_id: int, session: AsyncSession):
     """
     Функция для удаления пользователя.
@@ -298,17 +974,28 @@ async def delete_user_info_from_db(user_id: int, session: AsyncSession):
     select_user_result = await session.execute(select_user_query)
     user = select_user_result.scalar_one_or_none()
     if user:
+        revoked_datetime = datetime.datetime.now()
+        generation = user.token_generation + 1
         delete_user_query = (
-            update(UserORM).where(UserORM.id == user_id).values(deleted=1)
+            update(UserORM)
+            .where(UserORM.id == user_id)
+            .values(
+                deleted=1,
+                token_generation=UserORM.token_generation + 1,
+                token_revoked_datetime=revoked_datetime,
+            )
         )
         delete_user_documents_query = (
             update(DocumentsORM)
             .where(DocumentsORM.user_id == user_id, DocumentsORM.deleted == 0)
             .values(deleted=1)
         )
+        await record_user_document_changes("delete", [user_id], session)
         await session.execute(delete_user_query)
         await session.execute(delete_user_documents_query)
+        await record_changes("user", "delete", [(user_id, user_id)], session)
         await session.commit()
+        revocations.revoke(user_id, generation, revoked_datetime)
     else:
         raise UserNotFound
 
@@ -320,31 +1007,176 @@ async def delete_document(document_id: int, session: AsyncSession, user_id: int
     :param session: сессия работы с базой данных.
     :param user_id: id удаляемого пользователя.
     """
+    modify_datetime = datetime.datetime.now()
     delete_query = (
-        update(DocumentsORM).where(DocumentsORM.id == document_id).values(deleted=1)
+        update(DocumentsORM)
+        .where(DocumentsORM.id == document_id, DocumentsORM.deleted == 0)
+        .values(deleted=1, modify_datetime=modify_datetime)
     )
     if user_id:
         delete_query = (
             update(DocumentsORM)
-            .where(DocumentsORM.id == document_id, DocumentsORM.user_id == user_id)
-            .values(deleted=1)
+            .where(
+                DocumentsORM.id == document_id,
+                DocumentsORM.user_id == user_id,
+                DocumentsORM.deleted == 0,
+            )
+            .values(deleted=1, modify_datetime=modify_datetime)
         )
     result = await session.execute(delete_query)
+    if result.rowcount == 1:
+        await session.execute(
+            insert(ChangeORM).from_select(
+                ["entity", "entity_id", "user_id", "action", "create_datetime"],
+                select(
+                    literal("document"),
+                    DocumentsORM.id,
+                    DocumentsORM.user_id,
+                    literal("delete"),
+                    literal(modify_datetime),
+                ).where(DocumentsORM.id == document_id),
+            )
+        )
+        await session.execute(
+            update(UserORM)
+            .where(
+                UserORM.id
+                == select(DocumentsORM.user_id)
+                .where(DocumentsORM.id == document_id)
+                .scalar_subquery()
+            )
+            .values(data_version=UserORM.data_version + 1)
+        )
+        mark_changed(session)
     await session.commit()
     if result.rowcount != 1:
         raise DocumentNotExist
 
 
+def chunked(ids: List[int]):
+    """
+    Функция разбиения списка id без повторов на части не более settings.DELETE_CHUNK_SIZE.
+    :param ids: список id.
+    :return list[int]
+    """
+    ids = list(dict.fromkeys(ids))
+    chunk_size = settings.DELETE_CHUNK_SIZE
+    for start in range(0, len(ids), chunk_size):
+        yield ids[start : start + chunk_size]
+
+
+async def delete_users_bulk(
+    user_ids: List[int], modifier_id: int, session: AsyncSession
+):
+    """
+    Функция пакетного удаления пользователей и их документов одной транзакцией.
+    Для каждой части списка выполняется поиск существующих пользователей,
+    запись изменений их документов и два UPDATE ... WHERE id IN (...).
+    Токены доступа удаленных пользователей отзываются.
+    :param user_ids: список id удаляемых пользователей.
+    :param modifier_id: id пользователя, который вносит изменения.
+    :param session: сессия работы с базой данных.
+    :return (int, list[int]): число удаленных пользователей и id не найденных пользователей.
+    """
+    modify_datetime = datetime.datetime.now()
+    generations = {}
+    not_found = []
+    for chunk in chunked(user_ids):
+        result = await session.execute(
+            select(UserORM.id, UserORM.token_generation).where(
+                UserORM.id.in_(chunk), UserORM.deleted == 0
+            )
+        )
+        found = dict(result.tuples().all())
+        not_found.extend(user_id for user_id in chunk if user_id not in found)
+        if not found:
+            continue
+        generations.update(found)
+        await record_user_document_changes("delete", list(found), session)
+        await session.execute(
+            update(UserORM)
+            .where(UserORM.id.in_(found))
+            .values(
+                deleted=1,
+                modify_datetime=modify_datetime,
+                modify_user_id=modifier_id,
+                token_generation=UserORM.token_generation + 1,
+                token_revoked_datetime=modify_datetime,
+            )
+        )
+        await record_changes(
+            "user", "delete", [(user_id, user_id) for user_id in found], session
+        )
+        await session.execute(
+            update(DocumentsORM)
+            .where(DocumentsORM.user_id.in_(found), DocumentsORM.deleted == 0)
+            .values(
+                deleted=1,
+                modify_datetime=modify_datetime,
+                modify_user_id=modifier_id,
+            )
+        )
+    await session.commit()
+    for user_id, generation in generations.items():
+        revocations.revoke(user_id, generation + 1, modify_datetime)
+    return len(generations), not_found
+
+
+async def delete_documents_bulk(
+    document_ids: List[int], modifier_id: int, session: AsyncSession
+):
+    """
+    Функция пакетного удаления документов одной транзакцией.
+    Для каждой части списка выполняется поиск существующих документов и UPDATE ... WHERE id IN (...).
+    :param document_ids: список id удаляемых документов.
+    :param modifier_id: id пользователя, который вносит изменения.
+    :param session: сессия работы с базой данных.
+    :return (int, list[int]): число удаленных документов и id не найденных документов.
+    """
+    modify_datetime = datetime.datetime.now()
+    deleted = 0
+    not_found = []
+    for chunk in chunked(document_ids):
+        result = await session.execute(
+            select(DocumentsORM.id, DocumentsORM.user_id).where(
+                DocumentsORM.id.in_(chunk), DocumentsORM.deleted == 0
+            )
+        )
+        found = dict(result.tuples().all())
+        not_found.extend(
+            document_id for document_id in chunk if document_id not in found
+        )
+        if not found:
+            continue
+        await session.execute(
+            update(DocumentsORM)
+            .where(DocumentsORM.id.in_(found))
+            .values(
+                deleted=1,
+                modify_datetime=modify_datetime,
+                modify_user_id=modifier_id,
+            )
+        )
+        await record_changes("document", "delete", list(found.items()), session)
+        deleted += len(found)
+    await session.commit()
+    return deleted, not_found
+
+
 async def update_user(
     modifier_id: int, user_id: int, user_update: UserUpdate, session: AsyncSession
 ):
     """
-    Функция обновления пользователя.
+    Функция обновления пользователя. Токены доступа пользователя отзываются.
     :param modifier_id: id пользователя, который вности изменения.
     :param user_id: id изменяемого пользователя.
     :param user_update: вносимое обновление.
     :param session: сессия работы с базой данных.
     """
+    # пароль хэшируется до начала транзакции
+    password_hash = None
+    if user_update.password:
+        password_hash = await hash_password(user_update.password)
     select_user_query = select(UserORM).where(
         UserORM.id == user_id, UserORM.deleted == 0
     )
@@ -356,16 +1188,64 @@ async def update_user(
         user.patr_name = user_update.patrName or user.patr_name
         user.gender_id = user_update.sex or user.gender_id
         user.login = user_update.login or user.login
-        user.password = base64.b64encode(user_update.password.encode()) or user.password
+        if password_hash:
+            user.password = password_hash
+        modify_datetime = datetime.datetime.now()
+        generation = user.token_generation + 1
         user.modify_user_id = modifier_id
-        user.modify_datetime = datetime.datetime.now()
+        user.modify_datetime = modify_datetime
+        user.token_generation = generation
+        user.token_revoked_datetime = modify_datetime
 
         session.add(user)
+        await record_changes("user", "update", [(user_id, user_id)], session)
         await session.commit()
+        revocations.revoke(user_id, generation, modify_datetime)
     else:
         raise UserNotFound
 
 
+def merge_document(
+    document: DocumentsORM,
+    document_update: Document,
+    modifier_id: int,
+    modify_datetime: datetime.datetime,
+):
+    """
+    Функция применения обновления к документу в памяти.
+    Заполненные поля обновления заменяют поля документа, результат проверяется
+    функцией validate_document. Документ изменяется только после успешной проверки,
+    ошибки проверки выбрасываются исключением BadValidation.
+    :param document: изменяемый документ.
+    :param document_update: вносимое обновление.
+    :param modifier_id: id пользователя, который вности изменения.
+    :param modify_datetime: дата и время изменения.
+    """
+    type_id = document_update.documentType_id or document.type_id
+    update_data = document_update.model_dump()
+    update_data.pop("documentType_id", None)
+    update_data.pop("id", None)
+    current_data = dict(document.data or {})
+    for key, value in update_data.items():
+        if value:
+            current_data[key] = value
+    try:
+        document_data_obj = DocumentData.model_validate(current_data)
+        merged_document = Document.model_validate(
+            {**current_data, "id": document.id, "documentType_id": type_id}
+        )
+    except ValidationError as exc:
+        error = exc.errors()[0]
+        raise BadValidation(
+            f"Неверный формат документа {document.id}. {error['loc'][-1]} : {error['input']}"
+        )
+    validate_document(merged_document, type_id)
+    document.type_id = type_id
+    document.data = document_data_obj.model_dump(mode="json")
+    document.modify_user_id = modifier_id
+    document.modify_datetime = modify_datetime
+
+
 async def update_document(
     modifier_id: int,
     document_update: Document,
@@ -392,20 +1272,66 @@ async def update_document(
     result = await session.execute(select_document_query)
     document = result.scalar_one_or_none()
     if document:
-        document.type_id = document_update.documentType_id or document.type_id
-        current_data = DocumentData.model_validate_json(document.data).model_dump()
-        update_data = document_update.model_dump()
-        update_data.pop("documentType_id", None)
-        update_data.pop("id", None)
-        for key, value in update_data.items():
-            if value:
-                current_data[key] = value
-        document_data_obj = DocumentData.model_validate(current_data)
-        validate_document(document_data_obj, document.type_id)
-        document.data = document_data_obj.model_dump_json()
-        document.modify_user_id = modifier_id
-        document.modify_datetime = datetime.datetime.now()
+        merge_document(document, document_update, modifier_id, datetime.datetime.now())
         session.add(document)
+        await record_changes(
+            "document", "update", [(document.id, document.user_id)], session
+        )
         await session.commit()
     else:
         raise DocumentNotExist
+
+
+async def update_documents_bulk(
+    modifier_id: int,
+    document_updates: List[Document],
+    session: AsyncSession,
+    user_id: int = None,
+):
+    """
+    Функция пакетного обновления документов.
+    Все документы загружаются одним запросом, обновления применяются и проверяются в памяти
+    функцией merge_document, изменения фиксируются одной транзакцией.
+    Документы с ошибками пропускаются, ошибки возвращаются по каждому документу.
+    :param modifier_id: id пользователя, который вности изменения.
+    :param document_updates: список вносимых обновлений.
+    :param session: сессия работы с базой данных.
+    :param user_id: id владельца документов.
+    :return (int, list[dict]): число обновленных документов и ошибки (id, detail).
+    """
+    if not document_updates:
+        return 0, []
+    select_documents_query = select(DocumentsORM).where(
+        DocumentsORM.id.in_({update.id for update in document_updates}),
+        DocumentsORM.deleted == 0,
+    )
+    if user_id:
+        select_documents_query = select_documents_query.where(
+            DocumentsORM.user_id == user_id
+        )
+    result = await session.execute(select_documents_query)
+    documents = {document.id: document for document in result.scalars()}
+    modify_datetime = datetime.datetime.now()
+    updated = set()
+    errors = []
+    for document_update in document_updates:
+        document = documents.get(document_update.id)
+        if document is None:
+            errors.append(
+                {"id": document_update.id, "detail": "Документ не существует"}
+            )
+            continue
+        try:
+            merge_document(document, document_update, modifier_id, modify_datetime)
+        except BadValidation as exc:
+            errors.append({"id": document_update.id, "detail": exc.message})
+            continue
+        updated.add(document.id)
+    await record_changes(
+        "document",
+        "update",
+        [(document_id, documents[document_id].user_id) for document_id in updated],
+        session,
+    )
+    await session.commit()
+    return len(updated), errors
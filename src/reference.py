@@ -0,0 +1,161 @@
+"""
+Модуль reference содержит справочники типов документов, типов пользователей и полов.
+
+Справочники загружаются из базы при запуске приложения и обновляются
+каждые REFERENCE_REFRESH_INTERVAL секунд или по сигналу SIGHUP.
+Если загрузить справочники при запуске не удалось, приложение не запускается.
+До первой загрузки проверки по справочникам не пропускаются, а завершаются исключением
+ReferenceNotLoaded, поэтому скрипты, которые не запускают приложение, загружают справочники
+функцией refresh.
+"""
+
+import asyncio
+import logging
+import signal
+from typing import Dict, Tuple
+from sqlalchemy import select
+from config import settings
+from database import session_factory
+from exceptions import ReferenceNotLoaded
+from models import DocumentTypesORM, GenderORM, UserTypesORM
+
+logger = logging.getLogger()
+
+
+class ReferenceData:
+    """
+    Класс ReferenceData. Справочники в памяти процесса.
+    Справочник заменяется целиком, поэтому проверки не видят частично загруженных данных.
+
+    document_types - типы документов: id -> наименование
+
+    document_fields - обязательные поля документов: id типа -> поля
+
+    user_types - типы пользователей: id -> наименование
+
+    genders - полы: id -> наименование
+
+    refresh_interval - интервал обновления справочников в секундах
+
+    loaded - справочники загружены из базы
+    """
+
+    def __init__(self, refresh_interval: float):
+        self.refresh_interval = refresh_interval
+        self.document_types: Dict[int, str] = {}
+        self.document_fields: Dict[int, Tuple[str, ...]] = {}
+        self.user_types: Dict[int, str] = {}
+        self.genders: Dict[int, str] = {}
+        self.loaded = False
+        self._task = None
+        self._refresh_requested = None
+
+    def show(self):
+        """
+        Функция получения справочников для отправки в качестве ответа на запрос.
+        :return dict
+        """
+        return {
+            "document_types": [
+                {
+                    "id": key,
+                    "name": value,
+                    "required_fields": list(self.document_fields[key]),
+                }
+                for key, value in self.document_types.items()
+            ],
+            **{
+                name: [{"id": key, "name": value} for key, value in table.items()]
+                for name, table in (
+                    ("user_types", self.user_types),
+                    ("genders", self.genders),
+                )
+            },
+        }
+
+    async def refresh(self):
+        """
+        Функция загрузки справочников из базы данных одной сессией.
+        """
+        tables = []
+        async with session_factory() as session:
+            result = await session.execute(
+                select(
+                    DocumentTypesORM.id,
+                    DocumentTypesORM.name,
+                    DocumentTypesORM.required_fields,
+                ).where(DocumentTypesORM.deleted == 0)
+            )
+            document_types = result.all()
+            for model in (UserTypesORM, GenderORM):
+                result = await session.execute(
+                    select(model.id, model.name).where(model.deleted == 0)
+                )
+                tables.append(dict(result.tuples().all()))
+        self.document_types = {row.id: row.name for row in document_types}
+        self.document_fields = {
+            row.id: tuple(row.required_fields or ()) for row in document_types
+        }
+        self.user_types, self.genders = tables
+        self.loaded = True
+
+    def require(self):
+        """
+        Функция проверки, что справочники загружены.
+        Если справочники не загружены, выбрасывается исключение ReferenceNotLoaded.
+        """
+        if not self.loaded:
+            raise ReferenceNotLoaded
+
+    def request_refresh(self):
+        """
+        Функция запроса внеочередного обновления справочников.
+        """
+        if self._refresh_requested is not None:
+            self._refresh_requested.set()
+
+    async def start(self):
+        """
+        Функция загрузки справочников и запуска их периодического обновления.
+        Вызывается при запуске приложения. Ошибка загрузки прерывает запуск.
+        """
+        await self.refresh()
+        self._refresh_requested = asyncio.Event()
+        try:
+            asyncio.get_running_loop().add_signal_handler(
+                signal.SIGHUP, self.request_refresh
+            )
+        except (AttributeError, NotImplementedError, RuntimeError):
+            pass
+        self._task = asyncio.create_task(self._refresh_loop())
+
+    async def stop(self):
+        """
+        Функция остановки обновления справочников.
+        """
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        try:
+            asyncio.get_running_loop().remove_signal_handler(signal.SIGHUP)
+        except (AttributeError, NotImplementedError, RuntimeError):
+            pass
+
+    async def _refresh_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(
+                    self._refresh_requested.wait(), self.refresh_interval
+                )
+            except asyncio.TimeoutError:
+                pass
+            self._refresh_requested.clear()
+            try:
+                await self.refresh()
+            except Exception as exc:
+                logger.error(f"Reference data refresh failed. {exc}")
+
+
+# Справочники процесса
+reference = ReferenceData(settings.REFERENCE_REFRESH_INTERVAL)
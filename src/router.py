@@ -2,78 +2,206 @@
 Модуль router содержит все эндпоинты приложения.
 """
 
-from fastapi import APIRouter, Depends, Header
+import time
+from fastapi import APIRouter, Depends, Header, Request, Response
 from fastapi.responses import JSONResponse
-from typing import Annotated, List
-from exceptions import NotAdmin
-from schemas import Package, UserAuth, UserShow, UserUpdate, Document
+from typing import Annotated, List, Optional
+import orjson
+from changes import change_notifier
+from common import (
+    decode_cursor,
+    encode_cursor,
+    etag_matches,
+    fast_json_response,
+    shape_user_show,
+    user_show_adapter,
+)
+from exceptions import BadValidation, JobNotFound, NotAdmin
+from ingestion import StreamIngestion, ingest_packages, iter_ndjson_lines
+from jobs import ingestion_jobs
+from schemas import (
+    Package,
+    UserAuth,
+    UserShow,
+    UserUpdate,
+    Document,
+    JobShow,
+    IdList,
+)
 from sqlalchemy.ext.asyncio import AsyncSession
 from queries import (
-    create_organization,
-    create_user,
-    get_user_info_by_login_and_password,
-    get_users_info,
+    get_token_user_by_login_and_password,
+    get_changes,
+    get_user_info_by_id,
+    get_user_version_by_login_and_password,
+    get_users_info_aggregated,
     delete_user_info_from_db,
     delete_document,
+    delete_users_bulk,
+    delete_documents_bulk,
     update_user,
     update_document,
+    update_documents_bulk,
 )
 from config import settings
 from depends import get_session, authorization, admin_authorization
-
+from reference import reference
+from tokens import issue_token
 
 router = APIRouter(prefix="/api")
 
 
+@router.post("/login")
+async def login_user(
+    login: Annotated[str, Header()],
+    password: Annotated[str, Header()],
+    session: AsyncSession = Depends(get_session),
+):
+    user, generation = await get_token_user_by_login_and_password(
+        login, password, session
+    )
+    return JSONResponse(
+        {
+            "access_token": issue_token(user, generation),
+            "token_type": "bearer",
+            "expires_in": settings.TOKEN_TTL,
+        }
+    )
+
+
+@router.get("/reference_data")
+async def get_reference_data():
+    return JSONResponse(reference.show())
+
+
 @router.post("/add_information")
 async def get_user_info(
     packages: List[Package],
+    async_mode: bool = False,
+    partial: bool = False,
+    session: AsyncSession = Depends(get_session),
+    creator: UserAuth = Depends(authorization),
+):
+    if async_mode:
+        job = ingestion_jobs.submit(packages, creator.id, partial)
+        return JSONResponse({"status": "accepted", "job_id": job.id}, status_code=202)
+    try:
+        result = await ingest_packages(
+            packages,
+            creator.id,
+            session,
+            concurrency=settings.INGESTION_CONCURRENCY,
+            partial=partial,
+        )
+        if result["errors"]:
+            return JSONResponse(
+                {"detail": result["errors"][0]["detail"], **result}, status_code=400
+            )
+        if not partial:
+            return JSONResponse({"status": "ok", "skipped": result["skipped"]})
+        failed = any(user["status"] == "failed" for user in result["users"])
+        return JSONResponse(
+            {
+                "status": "partial" if failed else "ok",
+                "skipped": result["skipped"],
+                "users": result["users"],
+            }
+        )
+    except:
+        await session.rollback()
+        raise
+
+
+@router.post("/add_information_stream")
+async def add_information_stream(
+    request: Request,
     session: AsyncSession = Depends(get_session),
     creator: UserAuth = Depends(authorization),
 ):
+    ingestion = StreamIngestion(creator.id, session, settings.STREAM_CHUNK_SIZE)
     try:
-        for package in packages:
-            datas = package.Data
-            for data in datas:
-                organization = data.Sender.Organization
-                users = data.Users
-                await create_organization(organization, creator.id, session)
-                for user in users:
-                    await create_user(
-                        user,
-                        creator.id,
-                        organization.fullName,
-                        package.id,
-                        package.referralDate,
-                        session,
-                    )
-                await session.commit()
-        return JSONResponse({"status": "ok"})
+        async for line_number, line in iter_ndjson_lines(request.stream()):
+            await ingestion.add_record(line_number, line)
+        await ingestion.flush()
+        return JSONResponse({"status": "ok", **ingestion.report()})
+    except BadValidation as exc:
+        await session.rollback()
+        return JSONResponse(
+            {"detail": exc.message, **ingestion.report()}, status_code=400
+        )
     except:
         await session.rollback()
         raise
 
 
+@router.get("/ingestion_job")
+async def get_ingestion_job(
+    job_id: str,
+    user: UserAuth = Depends(authorization),
+) -> JobShow:
+    job = ingestion_jobs.get(job_id)
+    if job is None or (user.type_id != 1 and job.creator_id != user.id):
+        raise JobNotFound
+    return job.show()
+
+
 @router.get("/get_personal_info")
 async def get_user_info(
+    response: Response,
     login: Annotated[str, Header()],
     password: Annotated[str, Header()],
+    if_none_match: Annotated[Optional[str], Header()] = None,
     session: AsyncSession = Depends(get_session),
 ) -> UserShow:
-    user_info = await get_user_info_by_login_and_password(login, password, session)
+    user_id, etag = await get_user_version_by_login_and_password(
+        login, password, session
+    )
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    user_info = await get_user_info_by_id(user_id, session)
+    if settings.FAST_SERIALIZATION:
+        return fast_json_response(user_show_adapter.dump_json(user_info), headers)
+    response.headers.update(headers)
     return user_info
 
 
 @router.get("/get_users_data")
 async def get_user_info(
+    response: Response,
     page: int = 1,
+    cursor: str = None,
+    document_number: str = None,
+    document_series: str = None,
+    sender_name: str = None,
     admin: UserAuth = Depends(admin_authorization),
     session: AsyncSession = Depends(get_session),
 ) -> List[UserShow]:
     if admin.type_id == 1:
         limit = settings.PAGE_SIZE
-        offset = (page - 1) * limit
-        list_of_users = await get_users_info(session, limit, offset)
+        filters = dict(
+            document_number=document_number,
+            document_series=document_series,
+            sender_name=sender_name,
+        )
+        if cursor:
+            list_of_users = await get_users_info_aggregated(
+                session, limit, after_id=decode_cursor(cursor), **filters
+            )
+        else:
+            offset = (page - 1) * limit
+            list_of_users = await get_users_info_aggregated(
+                session, limit, offset, **filters
+            )
+        headers = {}
+        if len(list_of_users) == limit:
+            headers["X-Next-Cursor"] = encode_cursor(list_of_users[-1]["id"])
+        if settings.FAST_SERIALIZATION:
+            return fast_json_response(
+                orjson.dumps([shape_user_show(user) for user in list_of_users]),
+                headers,
+            )
+        response.headers.update(headers)
         return list_of_users
     else:
         raise NotAdmin
@@ -94,6 +222,7 @@ async def delete_user_info(
         return JSONResponse({"status": "user deleted"})
     except:
         await session.rollback()
+        raise
 
 
 @router.delete("/delete_user_document")
@@ -110,6 +239,41 @@ async def delete_user_document(
         return JSONResponse({"status": "document deleted"})
     except:
         await session.rollback()
+        raise
+
+
+@router.post("/bulk_delete_users")
+async def bulk_delete_users(
+    users: IdList,
+    admin: UserAuth = Depends(admin_authorization),
+    session: AsyncSession = Depends(get_session),
+):
+    try:
+        deleted, not_found = await delete_users_bulk(users.ids, admin.id, session)
+        return JSONResponse(
+            {"status": "users deleted", "deleted": deleted, "not_found": not_found}
+        )
+    except:
+        await session.rollback()
+        raise
+
+
+@router.post("/bulk_delete_documents")
+async def bulk_delete_documents(
+    documents: IdList,
+    admin: UserAuth = Depends(admin_authorization),
+    session: AsyncSession = Depends(get_session),
+):
+    try:
+        deleted, not_found = await delete_documents_bulk(
+            documents.ids, admin.id, session
+        )
+        return JSONResponse(
+            {"status": "documents deleted", "deleted": deleted, "not_found": not_found}
+        )
+    except:
+        await session.rollback()
+        raise
 
 
 @router.put("/update_user")
@@ -127,6 +291,7 @@ async def update_user_info(
         return JSONResponse({"status": "user updated"})
     except:
         await session.rollback()
+        raise
 
 
 @router.put("/update_document")
@@ -143,3 +308,50 @@ async def update_document_info(
         return JSONResponse({"status": "document updated"})
     except:
         await session.rollback()
+        raise
+
+
+@router.put("/update_documents")
+async def update_documents_info(
+    updates: List[Document],
+    user: UserAuth = Depends(authorization),
+    session: AsyncSession = Depends(get_session),
+):
+    try:
+        if user.type_id == 1:
+            updated, errors = await update_documents_bulk(user.id, updates, session)
+        else:
+            updated, errors = await update_documents_bulk(
+                user.id, updates, session, user.id
+            )
+        return JSONResponse(
+            {"status": "documents updated", "updated": updated, "errors": errors}
+        )
+    except:
+        await session.rollback()
+        raise
+
+
+@router.get("/changes")
+async def get_changes_feed(
+    after: int = 0,
+    limit: int = 100,
+    wait: float = 0,
+    admin: UserAuth = Depends(admin_authorization),
+    session: AsyncSession = Depends(get_session),
+):
+    limit = max(1, min(limit, settings.CHANGES_MAX_LIMIT))
+    deadline = time.monotonic() + max(0.0, min(wait, settings.CHANGES_MAX_WAIT))
+    try:
+        changes = await get_changes(after, limit, session)
+        while not changes and (remaining := deadline - time.monotonic()) > 0:
+            # на время ожидания соединение возвращается в пул,
+            # следующий запрос выполняется в новой транзакции и видит новые изменения
+            await session.close()
+            await change_notifier.wait(min(remaining, settings.CHANGES_POLL_INTERVAL))
+            changes = await get_changes(after, limit, session)
+        last = changes[-1]["seq"] if changes else after
+        return JSONResponse({"changes": changes, "last": last})
+    except:
+        await session.rollback()
+        raise
@@ -1,5 +1,5 @@
 """
-Модуль schemas содержит pydantic модели, используемые при валидации запросов и отправке ответов. 
+Модуль schemas содержит pydantic модели, используемые при валидации запросов и отправке ответов.
 """
 
 import datetime
@@ -10,6 +10,7 @@ from pydantic.functional_validators import (
 )
 from typing import Annotated, List, Optional
 import re
+from reference import reference
 
 
 def is_digit_str(v: str):
@@ -79,9 +80,13 @@ def oid_validation(v: str):
 
 def check_gender(v: Optional[int]):
     """
-    Функция проверки типа пола.
+    Функция проверки типа пола по справочнику полов.
+    До загрузки справочника выбрасывается исключение ReferenceNotLoaded.
     """
-    if v is None or v == 1 or v == 2:
+    if v is None:
+        return v
+    reference.require()
+    if v in reference.genders:
         return v
     else:
         raise AssertionError("Неверный тип пола")
@@ -89,9 +94,11 @@ def check_gender(v: Optional[int]):
 
 def check_document_type(v: int):
     """
-    Функция проверки типа документа.
+    Функция проверки типа документа по справочнику типов документов.
+    До загрузки справочника выбрасывается исключение ReferenceNotLoaded.
     """
-    if v > 0 and v < 5:
+    reference.require()
+    if v in reference.document_types:
         return v
     else:
         raise AssertionError("Неверный тип документа")
@@ -196,6 +203,16 @@ class UserUpdate(BaseModel):
     password: Optional[NotEmptyString] = None
 
 
+class IdList(BaseModel):
+    """
+    Класс IdList. Представляет собой список id записей для пакетной обработки.
+
+    ids - список id
+    """
+
+    ids: List[int]
+
+
 class User(BaseModel):
     """
     Класс User Представляет собой данные при регистрации.
@@ -348,3 +365,31 @@ class UserShow(UserAuth):
     patrName: Optional[str] = None
     gender_id: Optional[int] = None
     documents: List[DocumentShow]
+
+
+class JobShow(BaseModel):
+    """
+    Класс JobShow. Представляет ответ на запрос состояния задачи загрузки.
+
+    id - id задачи
+
+    state - состояние задачи (queued, running, done, failed)
+
+    rows - число записанных строк
+
+    errors - список ошибок
+
+    skipped - список ГУИД посылок, записанных ранее
+
+    create_datetime - дата и время создания задачи
+
+    finish_datetime - дата и время завершения задачи
+    """
+
+    id: str
+    state: str
+    rows: int = 0
+    errors: List[str] = []
+    skipped: List[str] = []
+    create_datetime: datetime.datetime
+    finish_datetime: Optional[datetime.datetime] = None
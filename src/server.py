@@ -0,0 +1,39 @@
+"""
+Модуль server. Запуск сервера в рабочем режиме.
+
+Сервер запускается несколькими процессами (WORKERS), которые принимают соединения
+с одного порта под управлением процесса uvicorn. Каждый процесс импортирует приложение заново,
+поэтому движок и пул соединений с базой данных создаются отдельно в каждом процессе.
+Если установлены uvloop и httptools, они используются вместо стандартного цикла событий
+и разборщика HTTP. При WORKERS > 1 должен быть задан TOKEN_SECRET: иначе каждый процесс
+создает свой ключ подписи и не принимает токены, выданные другими процессами.
+"""
+
+import os
+import uvicorn
+from config import settings
+
+
+def run():
+    """
+    Функция запуска сервера с параметрами из настроек.
+    """
+    if settings.WORKERS > 1 and not settings.TOKEN_SECRET:
+        raise SystemExit("TOKEN_SECRET must be set when WORKERS > 1.")
+    uvicorn.run(
+        "main:app",
+        app_dir=os.path.dirname(os.path.abspath(__file__)),
+        host=settings.SERVER_HOST,
+        port=settings.SERVER_PORT,
+        workers=settings.WORKERS,
+        loop="auto",
+        http="auto",
+        backlog=settings.SERVER_BACKLOG,
+        timeout_keep_alive=settings.TIMEOUT_KEEP_ALIVE,
+        timeout_graceful_shutdown=settings.TIMEOUT_GRACEFUL_SHUTDOWN,
+        access_log=settings.DEBUG,
+    )
+
+
+if __name__ == "__main__":
+    run()
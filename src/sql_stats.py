@@ -0,0 +1,94 @@
+"""
+Модуль sql_stats содержит учет SQL запросов, выполненных при обработке запроса к серверу.
+Запросы к основной базе и реплике учитываются через события движков SQLAlchemy в пределах контекста,
+открытого функцией collect_statements. Запросы вложенного контекста учитываются и во внешнем,
+поэтому проверка числа запросов вокруг вызова эндпоинта учитывает запросы обработчика.
+"""
+
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+class StatementStats:
+    """
+    Класс StatementStats. Содержит статистику выполненных SQL запросов.
+
+    statements - число выполненных запросов
+
+    seconds - суммарное время выполнения запросов в секундах
+
+    parent - статистика внешнего контекста или None
+    """
+
+    __slots__ = ("statements", "seconds", "parent")
+
+    def __init__(self, parent: Optional["StatementStats"] = None):
+        self.statements = 0
+        self.seconds = 0.0
+        self.parent = parent
+
+
+# Статистика текущего запроса к серверу
+current_stats: ContextVar[Optional[StatementStats]] = ContextVar(
+    "current_stats", default=None
+)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if current_stats.get() is not None:
+        conn.info.setdefault("statement_started", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = current_stats.get()
+    if stats is not None:
+        seconds = time.perf_counter() - conn.info["statement_started"].pop()
+        while stats is not None:
+            stats.statements += 1
+            stats.seconds += seconds
+            stats = stats.parent
+
+
+@event.listens_for(Engine, "handle_error")
+def _handle_error(context):
+    if current_stats.get() is not None and context.connection is not None:
+        started = context.connection.info.get("statement_started")
+        if started:
+            started.pop()
+
+
+@contextmanager
+def collect_statements():
+    """
+    Функция открытия контекста учета SQL запросов.
+    :return StatementStats: статистика, которая заполняется по мере выполнения запросов.
+    """
+    stats = StatementStats(current_stats.get())
+    token = current_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        current_stats.reset(token)
+
+
+@contextmanager
+def assert_statement_budget(max_statements: int, name: str = ""):
+    """
+    Функция проверки числа SQL запросов, выполненных в контексте.
+    Выбрасывает AssertionError, если выполнено больше max_statements запросов.
+    :param max_statements: максимальное число запросов.
+    :param name: имя проверяемого участка для сообщения об ошибке.
+    :return StatementStats
+    """
+    with collect_statements() as stats:
+        yield stats
+    assert stats.statements <= max_statements, (
+        f"{name or 'Блок'} выполнил {stats.statements} SQL запросов, "
+        f"допустимо не более {max_statements}"
+    )
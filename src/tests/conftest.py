@@ -0,0 +1,128 @@
+"""
+Общие фикстуры тестов.
+Тесты выполняются на базе данных из настроек и пропускаются, если база недоступна.
+Все запросы тестов, в том числе запросы эндпоинтов, выполняются в транзакции,
+которая откатывается по окончании теста.
+
+Запуск из корня репозитория: python -m pytest src/tests
+"""
+
+import asyncio
+import json
+import os
+import sys
+from urllib.parse import urlencode
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncSession
+from changes import change_sequencer
+from database import engine
+from depends import get_session
+from main import app
+from reference import reference
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+async def connection():
+    """
+    Фикстура соединения с базой данных с открытой транзакцией.
+    Перед тестом загружаются справочники, по окончании транзакция откатывается.
+    """
+    try:
+        await reference.refresh()
+    except (DBAPIError, OSError) as exc:
+        await engine.dispose()
+        pytest.skip(f"База данных недоступна. {exc}")
+    async with engine.connect() as connection:
+        transaction = await connection.begin()
+        try:
+            yield connection
+        finally:
+            await transaction.rollback()
+    await change_sequencer.stop()
+    await engine.dispose()
+
+
+async def call_endpoint(
+    method: str, path: str, params: dict = None, body=None, headers: dict = None
+):
+    """
+    Функция вызова эндпоинта приложения без запуска сервера.
+    :param method: метод запроса.
+    :param path: путь запроса.
+    :param params: параметры строки запроса.
+    :param body: тело запроса, сериализуется в JSON.
+    :param headers: заголовки запроса.
+    :return (int, object): код ответа и тело ответа.
+    """
+    content = b"" if body is None else json.dumps(body).encode()
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": urlencode(params or {}).encode(),
+        "root_path": "",
+        "headers": [(b"content-type", b"application/json")]
+        + [
+            (name.lower().encode(), value.encode())
+            for name, value in (headers or {}).items()
+        ],
+        "client": ("127.0.0.1", 0),
+        "server": ("test", 80),
+    }
+    received = False
+
+    async def receive():
+        nonlocal received
+        if not received:
+            received = True
+            return {"type": "http.request", "body": content, "more_body": False}
+        # клиент не отключается до окончания ответа
+        await asyncio.Event().wait()
+
+    response = {"status": None, "body": b""}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            response["status"] = message["status"]
+        elif message["type"] == "http.response.body":
+            response["body"] += message.get("body", b"")
+
+    await app(scope, receive, send)
+    return response["status"], (
+        json.loads(response["body"]) if response["body"] else None
+    )
+
+
+@pytest.fixture
+def client(connection):
+    """
+    Фикстура вызова эндпоинтов. Сессии эндпоинтов работают в транзакции фикстуры connection,
+    фиксация транзакции в эндпоинте не фиксирует изменения в базе.
+    :return call_endpoint
+    """
+
+    async def endpoint_session():
+        session = AsyncSession(bind=connection, join_transaction_mode="rollback_only")
+        try:
+            yield session
+        finally:
+            await session.close()
+
+    app.dependency_overrides[get_session] = endpoint_session
+    try:
+        yield call_endpoint
+    finally:
+        app.dependency_overrides.pop(get_session, None)
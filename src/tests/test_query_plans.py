@@ -0,0 +1,162 @@
+"""
+Проверка планов выполнения запросов горячих путей.
+Функции queries вызываются с сессией, которая только запоминает запросы, затем для каждого
+запроса выполняется EXPLAIN. Сами запросы не выполняются, поэтому проверка не изменяет данные.
+Проверка не проходит, если какая-либо таблица читается полным сканированием (type = ALL).
+На почти пустых таблицах оптимизатор может предпочесть полное сканирование,
+поэтому проверку имеет смысл выполнять на базе с данными, близкими к рабочим.
+"""
+
+import pytest
+from sqlalchemy import event
+from exceptions import BadAuthorization, DocumentNotExist, UserNotFound
+from queries import (
+    delete_document,
+    get_changes,
+    get_user_auth_by_login_and_password,
+    get_user_info_by_id,
+    get_user_version_by_login_and_password,
+    get_users_info_aggregated,
+)
+
+pytestmark = pytest.mark.anyio
+
+# Проверяемые функции: имя и вызов с сессией
+HOT_QUERIES = (
+    (
+        "get_user_auth_by_login_and_password",
+        lambda session: get_user_auth_by_login_and_password("admin", "-", session),
+    ),
+    (
+        "get_user_info_by_id",
+        lambda session: get_user_info_by_id(1, session),
+    ),
+    (
+        "get_user_version_by_login_and_password",
+        lambda session: get_user_version_by_login_and_password("admin", "-", session),
+    ),
+    (
+        "get_users_info_aggregated",
+        lambda session: get_users_info_aggregated(session, 10, after_id=0),
+    ),
+    (
+        "get_users_info_aggregated_by_document",
+        lambda session: get_users_info_aggregated(session, 10, document_number="0000"),
+    ),
+    (
+        "get_changes",
+        lambda session: get_changes(0, 100, session),
+    ),
+    ("delete_document", lambda session: delete_document(0, session, 0)),
+)
+
+EXPECTED_ERRORS = (BadAuthorization, DocumentNotExist, UserNotFound)
+
+
+class RecordedResult:
+    """
+    Класс RecordedResult. Результат незапущенного запроса: запросы чтения
+    не возвращают строк, запросы изменения изменяют одну строку,
+    поэтому функции выполняют и запросы, следующие за изменением.
+    """
+
+    rowcount = 1
+
+    def __iter__(self):
+        return iter(())
+
+    def one_or_none(self):
+        return None
+
+    def scalar_one_or_none(self):
+        return None
+
+    def all(self):
+        return []
+
+    def scalars(self):
+        return self
+
+    def tuples(self):
+        return self
+
+    def mappings(self):
+        return self
+
+
+class RecordingSession:
+    """
+    Класс RecordingSession. Сессия, которая запоминает переданные запросы, не выполняя их.
+    """
+
+    def __init__(self):
+        self.statements = []
+        self.info = {}
+
+    async def execute(self, statement, *args, **kwargs):
+        self.statements.append(statement)
+        return RecordedResult()
+
+    async def commit(self):
+        pass
+
+    async def rollback(self):
+        pass
+
+    async def close(self):
+        pass
+
+
+async def compile_statement(connection, statement):
+    """
+    Функция получения текста запроса и параметров в виде, в котором их получает драйвер.
+    Вместо запроса выполняется SELECT 1, поэтому запрос не изменяет данные.
+    :return (str, tuple)
+    """
+    captured = []
+
+    def capture(conn, cursor, sql, parameters, context, executemany):
+        captured.append((sql, parameters))
+        return "SELECT 1", ()
+
+    event.listen(
+        connection.sync_connection, "before_cursor_execute", capture, retval=True
+    )
+    try:
+        result = await connection.execute(statement)
+        result.close()
+    finally:
+        event.remove(connection.sync_connection, "before_cursor_execute", capture)
+    return captured[0]
+
+
+async def explain(connection, statement):
+    """
+    Функция получения плана выполнения запроса.
+    Для INSERT ... SELECT строка таблицы, в которую добавляются записи, не учитывается.
+    :return list[dict]
+    """
+    sql, parameters = await compile_statement(connection, statement)
+    result = await connection.exec_driver_sql("EXPLAIN " + sql, parameters)
+    return [
+        dict(row._mapping) for row in result if row._mapping["select_type"] != "INSERT"
+    ]
+
+
+@pytest.mark.parametrize(
+    "name, call", HOT_QUERIES, ids=[name for name, _ in HOT_QUERIES]
+)
+async def test_query_plan_uses_indexes(connection, name, call):
+    session = RecordingSession()
+    try:
+        await call(session)
+    except EXPECTED_ERRORS:
+        pass
+    assert session.statements, f"{name} не выполнил ни одного запроса"
+    full_scans = []
+    for statement in session.statements:
+        for row in await explain(connection, statement):
+            # производные таблицы (<derived2>, <subquery3>) строятся в памяти
+            if row["type"] == "ALL" and not str(row["table"]).startswith("<"):
+                full_scans.append(row["table"])
+    assert not full_scans, f"{name} читает полным сканированием: {full_scans}"
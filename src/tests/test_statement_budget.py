@@ -0,0 +1,190 @@
+"""
+Проверка числа SQL запросов эндпоинтов горячих путей.
+Эндпоинты вызываются внутри assert_statement_budget, число запросов сравнивается с допустимым:
+список пользователей выполняется постоянным числом запросов независимо от размера страницы,
+а запись посылок и пакетное удаление - числом запросов, зависящим от числа многострочных INSERT
+и частей списка id, а не от числа строк. Записи таблицы изменений добавляются
+многострочными INSERT в тех же транзакциях.
+"""
+
+import datetime
+import math
+import pytest
+from config import settings
+from schemas import Package, UserAuth
+from sql_stats import assert_statement_budget
+from tokens import issue_token
+from benchmarks.utils import make_users, rows_count
+
+pytestmark = pytest.mark.anyio
+
+# Начальный id тестовых пользователей, не пересекается с benchmarks.utils.seed_users
+START_ID = 20_000_000
+
+# Запросы поиска и добавления организаций
+ORGANIZATION_STATEMENTS = 3
+
+# Запрос проверки записанных посылок
+PROCESSED_PACKAGES_STATEMENTS = 1
+
+# Запросы добавления отметки о записи посылки
+CLAIM_STATEMENTS = 2
+
+# Запросы пакетного удаления одной части списка пользователей
+DELETE_CHUNK_STATEMENTS = 5
+
+# Число пользователей, которые записываются несколькими многострочными INSERT
+LARGE_PACKAGE_USERS = settings.INSERT_CHUNK_SIZE * 2 + 1
+
+
+def make_package(users: list, package_id: int):
+    """
+    Функция формирования тела запроса записи посылки с одним отправителем.
+    :return list[dict]
+    """
+    package = Package.model_validate(
+        {
+            "id": package_id,
+            "referralGUID": f"{package_id:018d}:BUDGET",
+            "referralDate": datetime.datetime(2024, 1, 23, 18, 55, 2),
+            "Data": [
+                {
+                    "Sender": {
+                        "Organization": {
+                            "oid": "1.2.3.4.5.6.8",
+                            "fullName": "Проверка запросов",
+                        }
+                    },
+                    "Users": users,
+                }
+            ],
+        }
+    )
+    return [package.model_dump(mode="json", by_alias=True)]
+
+
+def ingestion_budget(users: list):
+    """
+    Функция вычисления допустимого числа запросов записи посылки с одним отправителем.
+    """
+    user_rows = len(users)
+    document_rows = rows_count(users) - user_rows
+    chunk = settings.INSERT_CHUNK_SIZE
+    return (
+        PROCESSED_PACKAGES_STATEMENTS
+        + ORGANIZATION_STATEMENTS
+        + CLAIM_STATEMENTS
+        + math.ceil(user_rows / chunk)
+        + math.ceil(document_rows / chunk)
+        + 2 * math.ceil(user_rows / chunk)
+    )
+
+
+@pytest.fixture(autouse=True)
+def fast_password_hashing(monkeypatch):
+    # число запросов не зависит от числа итераций, а запись посылок ускоряется
+    monkeypatch.setattr(settings, "PASSWORD_HASH_ITERATIONS", 1000)
+
+
+@pytest.fixture
+def admin_headers():
+    token = issue_token(UserAuth(id=1, type_id=1), 0)
+    return {"Authorization": f"Bearer {token}"}
+
+
+async def add_users(client, headers: dict, count: int):
+    """
+    Функция записи тестовых пользователей посылкой.
+    :return list[User]
+    """
+    users = make_users(count, start_id=START_ID)
+    status, body = await client(
+        "POST",
+        "/api/add_information",
+        body=make_package(users, START_ID + count),
+        headers=headers,
+    )
+    assert status == 200, body
+    return users
+
+
+@pytest.mark.parametrize("count", [10, LARGE_PACKAGE_USERS])
+async def test_add_information(client, admin_headers, count):
+    users = make_users(count, start_id=START_ID)
+    with assert_statement_budget(ingestion_budget(users), "add_information"):
+        status, body = await client(
+            "POST",
+            "/api/add_information",
+            body=make_package(users, START_ID + count),
+            headers=admin_headers,
+        )
+    assert status == 200, body
+
+
+@pytest.mark.parametrize("page_size", [10, 100, 1000])
+async def test_get_users_data(client, admin_headers, monkeypatch, page_size):
+    monkeypatch.setattr(settings, "PAGE_SIZE", page_size)
+    with assert_statement_budget(1, "get_users_data"):
+        status, body = await client("GET", "/api/get_users_data", headers=admin_headers)
+    assert status == 200, body
+
+
+async def test_get_personal_info(client, admin_headers):
+    user = (await add_users(client, admin_headers, 1))[0]
+    credentials = {
+        "login": user.Credentials.username,
+        "password": user.Credentials.password,
+    }
+    with assert_statement_budget(3, "get_personal_info"):
+        status, body = await client(
+            "GET", "/api/get_personal_info", headers=credentials
+        )
+    assert status == 200, body
+    assert body["id"] == user.id
+
+
+@pytest.mark.parametrize("use_token", [False, True], ids=["password", "token"])
+async def test_authorization(client, admin_headers, use_token):
+    user = (await add_users(client, admin_headers, 1))[0]
+    if use_token:
+        token = issue_token(UserAuth(id=user.id, type_id=2), 0)
+        headers = {"Authorization": f"Bearer {token}"}
+    else:
+        headers = {
+            "login": user.Credentials.username,
+            "password": user.Credentials.password,
+        }
+    # обработчик не обращается к базе, поэтому учитываются только запросы авторизации
+    with assert_statement_budget(0 if use_token else 1, "authorization"):
+        status, body = await client(
+            "GET", "/api/ingestion_job", params={"job_id": "-"}, headers=headers
+        )
+    assert status == 400, body
+
+
+async def test_changes(client, admin_headers):
+    with assert_statement_budget(1, "changes"):
+        status, body = await client(
+            "GET",
+            "/api/changes",
+            params={"limit": settings.CHANGES_MAX_LIMIT},
+            headers=admin_headers,
+        )
+    assert status == 200, body
+
+
+async def test_bulk_delete_users(client, admin_headers):
+    users = await add_users(client, admin_headers, LARGE_PACKAGE_USERS)
+    user_ids = [user.id for user in users]
+    budget = DELETE_CHUNK_STATEMENTS * math.ceil(
+        len(user_ids) / settings.DELETE_CHUNK_SIZE
+    )
+    with assert_statement_budget(budget, "bulk_delete_users"):
+        status, body = await client(
+            "POST",
+            "/api/bulk_delete_users",
+            body={"ids": user_ids},
+            headers=admin_headers,
+        )
+    assert status == 200, body
+    assert body["deleted"] == len(user_ids)
@@ -0,0 +1,172 @@
+"""
+Модуль tokens содержит выпуск и проверку токенов доступа.
+
+Токен содержит id и тип пользователя, поколение токенов пользователя и срок действия,
+подписанные HMAC-SHA256 ключом TOKEN_SECRET. Проверка токена не обращается к базе данных.
+При изменении или удалении пользователя поколение токенов пользователя увеличивается,
+и ранее выданные токены отклоняются. Отзывы хранятся в памяти процесса и периодически
+загружаются из базы, поэтому отзыв, выполненный другим процессом сервера,
+применяется не позже чем через TOKEN_REVOCATION_REFRESH секунд.
+"""
+
+import asyncio
+import base64
+import datetime
+import hashlib
+import hmac
+import json
+import logging
+import secrets
+import time
+from typing import Dict, Tuple
+from sqlalchemy import select
+from config import settings
+from database import session_factory
+from exceptions import BadAuthorization
+from models import UserORM
+from schemas import UserAuth
+
+logger = logging.getLogger()
+
+# Ключ подписи токенов. Если TOKEN_SECRET не задан, ключ создается при запуске процесса
+# и токены, выданные одним процессом, не принимаются другими.
+_secret = (settings.TOKEN_SECRET or secrets.token_hex(32)).encode()
+
+
+def _encode(data: bytes):
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def _decode(data: str):
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+def _sign(payload: str):
+    return _encode(hmac.new(_secret, payload.encode(), hashlib.sha256).digest())
+
+
+def issue_token(user: UserAuth, generation: int):
+    """
+    Функция выпуска токена доступа.
+    :param user: объект класса UserAuth.
+    :param generation: поколение токенов пользователя.
+    :return str
+    """
+    payload = _encode(
+        json.dumps(
+            {
+                "id": user.id,
+                "type_id": user.type_id,
+                "gen": generation,
+                "exp": int(time.time()) + settings.TOKEN_TTL,
+            },
+            separators=(",", ":"),
+        ).encode()
+    )
+    return f"{payload}.{_sign(payload)}"
+
+
+def verify_token(token: str):
+    """
+    Функция проверки токена доступа: подписи, срока действия и поколения.
+    В случае ошибки выбрасывается исключение BadAuthorization.
+    :param token: токен.
+    :return UserAuth
+    """
+    payload, _, signature = token.partition(".")
+    if not hmac.compare_digest(signature.encode(), _sign(payload).encode()):
+        raise BadAuthorization
+    try:
+        claims = json.loads(_decode(payload))
+        user = UserAuth(id=claims["id"], type_id=claims["type_id"])
+        generation = claims["gen"]
+        expires = claims["exp"]
+    except (ValueError, KeyError, TypeError):
+        raise BadAuthorization
+    if expires < time.time() or revocations.is_revoked(user.id, generation):
+        raise BadAuthorization
+    return user
+
+
+class TokenRevocations:
+    """
+    Класс TokenRevocations. Реестр отзывов токенов в памяти процесса.
+    Хранит поколения токенов пользователей, отозванных за последние TOKEN_TTL секунд:
+    токены, выданные до более раннего отзыва, уже истекли.
+
+    refresh_interval - интервал загрузки отзывов из базы данных в секундах
+    """
+
+    def __init__(self, refresh_interval: int):
+        self.refresh_interval = refresh_interval
+        self._generations: Dict[int, Tuple[int, datetime.datetime]] = {}
+        self._task = None
+
+    def is_revoked(self, user_id: int, generation: int):
+        """
+        Функция проверки отзыва поколения токенов пользователя.
+        :return bool
+        """
+        revoked = self._generations.get(user_id)
+        return revoked is not None and generation < revoked[0]
+
+    def revoke(
+        self, user_id: int, generation: int, revoked_datetime: datetime.datetime
+    ):
+        """
+        Функция добавления отзыва, выполненного текущим процессом.
+        :param user_id: id пользователя.
+        :param generation: новое поколение токенов пользователя.
+        :param revoked_datetime: дата и время отзыва.
+        """
+        current = self._generations.get(user_id)
+        if current is None or current[0] < generation:
+            self._generations[user_id] = (generation, revoked_datetime)
+
+    async def refresh(self):
+        """
+        Функция загрузки отзывов за последние TOKEN_TTL секунд из базы данных.
+        """
+        since = datetime.datetime.now() - datetime.timedelta(seconds=settings.TOKEN_TTL)
+        async with session_factory() as session:
+            result = await session.execute(
+                select(
+                    UserORM.id, UserORM.token_generation, UserORM.token_revoked_datetime
+                ).where(UserORM.token_revoked_datetime > since)
+            )
+            rows = result.all()
+        generations = {
+            user_id: revoked
+            for user_id, revoked in self._generations.items()
+            if revoked[1] > since
+        }
+        self._generations = generations
+        for user_id, generation, revoked_datetime in rows:
+            self.revoke(user_id, generation, revoked_datetime)
+
+    def start(self):
+        """
+        Функция запуска периодической загрузки отзывов. Вызывается при запуске приложения.
+        """
+        self._task = asyncio.create_task(self._refresh_loop())
+
+    async def stop(self):
+        """
+        Функция остановки периодической загрузки отзывов.
+        """
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _refresh_loop(self):
+        while True:
+            try:
+                await self.refresh()
+            except Exception as exc:
+                logger.error(f"Token revocations refresh failed. {exc}")
+            await asyncio.sleep(self.refresh_interval)
+
+
+# Реестр отзывов токенов процесса
+revocations = TokenRevocations(settings.TOKEN_REVOCATION_REFRESH)